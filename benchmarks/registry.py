@@ -0,0 +1,137 @@
+"""Benchmark Registry.get_event_matches engines against a linear scan of
+events_re and of the retcode splitters
+
+Usage::
+
+    $ python benchmarks/registry.py [number]
+"""
+import re
+import functools
+import sys
+import timeit
+from ene.interfaces.protocols.irc import base
+from ene.interfaces.protocols.irc import rfc
+from ene.interfaces.protocols.irc import utils
+
+
+class Event:
+    """Minimal event. Same api as the one used by IrcObject.attach_events"""
+
+    def __init__(self, regexp, iotype='in'):
+        self.regexp = regexp
+        self.iotype = iotype
+
+    def compile(self, config):
+        regexp = getattr(self.regexp, 're', self.regexp)
+        return re.compile(regexp.format(**config)).match
+
+
+CONFIG = dict(nick='Ene')
+
+LINES = [
+    ':nick!user@host PRIVMSG #chan :hello world',
+    ':nick!user@host PRIVMSG Ene :Ene: hello',
+    ':nick!user@host NOTICE #chan :some notice',
+    ':nick!user@host JOIN #chan',
+    ':nick!user@host PART #chan :bye',
+    ':nick!user@host QUIT :*.net *.split',
+    ':nick!user@host MODE #chan +o nick',
+    ':irc.server.net 353 Ene = #chan :nick1 nick2 @nick3 +nick4',
+    ':irc.server.net 366 Ene #chan :End of /NAMES list.',
+    ':irc.server.net 332 Ene #chan :topic',
+    'PING :irc.server.net',
+]
+
+
+def get_events():
+    """rfc numerics + rfc raws + a few dozen plugin like events"""
+    events = []
+    for name in dir(rfc):
+        value = getattr(rfc, name)
+        regexp = getattr(value, 're', None)
+        if not isinstance(regexp, str):
+            continue
+        try:
+            re.compile(regexp.format(**CONFIG))
+        except (re.error, KeyError, IndexError, ValueError):
+            continue
+        events.append(Event(value))
+    for i in range(40):
+        events.append(Event(
+            r'^:(?P<mask>\S+!\S+@\S+) PRIVMSG (?P<target>\S+) '
+            r':!cmd%s(\s+(?P<data>.*)|$)' % i))
+    return events
+
+
+def get_linear(registry, iotype='in'):
+    """events_re and numeric splitters in registration order"""
+    items = list(registry.events_re[iotype])
+    for entries in registry.numerics[iotype].values():
+        items.extend(entries)
+    items.sort(key=lambda item: registry.positions[iotype][item[0]])
+    return items
+
+
+def linear(registry, data, iotype='in', items=None):
+    """The linear scan used before the matchers"""
+    events = registry.events[iotype]
+    if items is None:
+        items = get_linear(registry, iotype)
+    for regexp, cregexp in items:
+        match = cregexp(data)
+        if match is not None:
+            yield match, events[regexp]
+
+
+def as_dict(match):
+    """splitters return a dict. regexps a match object"""
+    if isinstance(match, dict):
+        return dict(match)
+    return match.groupdict()
+
+
+def get_registry(engine):
+    registry = base.Registry(engine=engine)
+    bot = base.IrcObject.__new__(base.IrcObject)
+    bot.registry = registry
+    bot.config = utils.Config(CONFIG)
+    bot.attach_events(*get_events())
+    # plugin regexps on numerics must keep their place among retcodes
+    bot.attach_events(
+        Event(r'^:(?P<srv>\S+) 332 (?P<me>\S+) (?P<channel>\S+) :.*'))
+    bot.attach_events(
+        Event(r'^:(?P<srv>\S+) 353 (?P<me>\S+) . (?P<channel>\S+)'),
+        insert=True)
+    return registry
+
+
+def main(number=2000):
+    registries = [(engine, get_registry(engine))
+                  for engine in ('index', 'adaptive', 'combined')]
+    registry = registries[0][1]
+
+    for line in LINES:
+        expected = [(as_dict(m), [e.regexp for e in events])
+                    for m, events in linear(registry, line)]
+        for engine, r in registries:
+            result = [(as_dict(m), [e.regexp for e in events])
+                      for m, events in r.get_event_matches(line)]
+            assert expected == result, (engine, line)
+
+    items = get_linear(registry)
+    print('%d patterns (%d retcodes split), %d lines x %d' % (
+        len(items), len(items) - len(registry.events_re['in']),
+        len(LINES), number))
+    funcs = [('linear', functools.partial(linear, registry, items=items))]
+    funcs.extend((engine, r.get_event_matches) for engine, r in registries)
+    for name, func in funcs:
+        def run():
+            for line in LINES:
+                for match, events in func(line):
+                    as_dict(match)
+        duration = timeit.timeit(run, number=number)
+        print('%-8s %.3fs' % (name, duration))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
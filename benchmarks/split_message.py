@@ -0,0 +1,57 @@
+"""Benchmark utils.split_message on 10 KB messages against the previous
+char based implementation
+
+Usage::
+
+    $ python benchmarks/split_message.py [number]
+"""
+import sys
+import timeit
+from ene.interfaces.protocols.irc import utils
+
+MAX_LENGTH = 400
+
+MESSAGES = [
+    ('ascii', ' '.join(['word%d' % i for i in range(1500)])[:10240]),
+    ('utf8', ' '.join(['\u65e5\u672c\u8a9e\xe9%d' % i
+                       for i in range(1100)])[:10240 // 2]),
+    ('colors', ' '.join(['\x0304,01red\x03 \x02bold\x02'] * 600)[:10240]),
+    ('no spaces', 'x' * 10240),
+]
+
+
+def legacy(message, max_length):
+    """The char based splitter used before"""
+    if len(message) >= max_length:
+        messages = message.split(' ')
+        message = ''
+        while messages:
+            buf = messages.pop(0)
+            if len(message) + len(buf) > max_length:
+                if message.strip(utils.STRIPPED_CHARS):
+                    yield message.strip(utils.STRIPPED_CHARS)
+                message = ''
+            message += ' ' + buf
+    message = message.strip(utils.STRIPPED_CHARS)
+    if message:
+        yield message
+
+
+def main(number=200):
+    for name, message in MESSAGES:
+        chunks = list(utils.split_message(message, MAX_LENGTH))
+        sizes = [len(chunk.encode('utf8')) for chunk in chunks]
+        assert max(sizes) <= MAX_LENGTH, (name, max(sizes))
+        too_long = [chunk for chunk in legacy(message, MAX_LENGTH)
+                    if len(chunk.encode('utf8')) > MAX_LENGTH]
+        print('%-10s %d bytes, %d chunks (legacy: %d chunks over %d bytes)' % (
+            name, len(message.encode('utf8')), len(chunks),
+            len(too_long), MAX_LENGTH))
+        for func in (legacy, utils.split_message):
+            duration = timeit.timeit(
+                lambda: list(func(message, MAX_LENGTH)), number=number)
+            print('    %-14s %.3fs' % (func.__name__, duration))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
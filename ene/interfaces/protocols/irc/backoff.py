@@ -0,0 +1,85 @@
+"""Reconnection policy"""
+import random
+
+
+def parse_server(server, port=6667):
+    """return (host, port) from a ``host[:port]`` string or a tuple:
+    .. code-block:: py
+        >>> parse_server('irc.example.org:6697')
+        ('irc.example.org', 6697)
+        >>> parse_server('irc.example.org')
+        ('irc.example.org', 6667)
+    """
+    if isinstance(server, str):
+        host, sep, value = server.rpartition(':')
+        if sep and value.isdigit() and ':' not in host:
+            return host, int(value)
+        return server, port
+    host, port = server
+    return host, int(port)
+
+
+class Backoff:
+    """Delays between reconnections. The delay is a random value between 0
+    and ``min(cap, base * 2 ** attempts)`` (full jitter). Attempts are
+    reset once a connection stayed up ``reset_after`` seconds. Failed
+    attempts rotate through servers"""
+
+    def __init__(self, loop, servers, base=1., cap=300., reset_after=60.):
+        self.loop = loop
+        self.servers = servers
+        self.base = base
+        self.cap = cap
+        self.reset_after = reset_after
+        self.index = 0
+        self.attempts = 0
+        self.total_attempts = 0
+        self.connected_at = None
+        self.disconnected_at = None
+        self.time_disconnected = 0.
+
+    @property
+    def server(self):
+        """(host, port) to use for the next connection"""
+        return self.servers[self.index % len(self.servers)]
+
+    def connected(self):
+        now = self.loop.time()
+        self.connected_at = now
+        if self.disconnected_at is not None:
+            self.time_disconnected += now - self.disconnected_at
+            self.disconnected_at = None
+
+    def disconnected(self, failed=False):
+        """must be called before a reconnection. failed is True when the
+        connection could not be established"""
+        now = self.loop.time()
+        if self.connected_at is not None:
+            if now - self.connected_at >= self.reset_after:
+                self.attempts = 0
+            self.connected_at = None
+        if self.disconnected_at is None:
+            self.disconnected_at = now
+        if failed:
+            self.index += 1
+
+    def get_delay(self):
+        """return the delay before the next attempt"""
+        exponent = min(self.attempts, 32)
+        delay = random.uniform(0, min(self.cap, self.base * 2 ** exponent))
+        self.attempts += 1
+        self.total_attempts += 1
+        return delay
+
+    def stats(self):
+        """return attempt counters and the time spent disconnected"""
+        time_disconnected = self.time_disconnected
+        if self.disconnected_at is not None:
+            time_disconnected += self.loop.time() - self.disconnected_at
+        return dict(
+            server='%s:%s' % self.server,
+            attempts=self.attempts,
+            total_attempts=self.total_attempts,
+            connected=self.connected_at is not None,
+            time_disconnected=time_disconnected,
+        )
@@ -1,25 +1,48 @@
 import os
 import sys
 import ssl
+import copy
+import json
 import signal
 import logging
 import logging.config
 import pkg_resources
 from . import utils
 from . import config
+from . import matchers
+from . import pool
+from . import rfc
+from .message import Message
 import asyncio
 from asyncio.queues import Queue, QueueFull
-# from .compat import reload_module
+from importlib import reload as reload_module
 # from .compat import string_types
 from collections import defaultdict
 
 version = pkg_resources.get_distribution('ene').version
 
+# format of the scan_cache file
+SCAN_CACHE_VERSION = 1
+
 
 class Registry:
     """Store (and hide from api) plugins events and stuff"""
 
-    def __init__(self):
+    def __init__(self, engine='index'):
+        engine = utils.maybedotted(matchers.ENGINES.get(engine, engine))
+        self.matchers = {
+            'in': engine(), 'out': engine(),
+            'dcc_in': engine(), 'dcc_out': engine(),
+        }
+        # (event class, template, config values) -> compiled regexp
+        self.compiled = {}
+        # (module name, categories) -> (stamp, calls) recorded while scanning
+        self.scans = {}
+        # (module name, categories) -> (stamp, calls as json data). read from
+        # and written to the scan_cache file
+        self.saved_scans = {}
+        # calls list of the module being scanned
+        self.recording = None
         self.reset(reloading=False)
 
     def reset(self, reloading=True):
@@ -33,9 +56,43 @@ class Registry:
             'dcc_in': defaultdict(list),
             'dcc_out': defaultdict(list),
         }
+        for iotype in self.matchers:
+            self.changed(iotype)
+        # numeric -> [(regexp, NumericSplitter)]. retcode events are found
+        # with a dict lookup instead of events_re
+        self.numerics = {
+            'in': {}, 'out': {},
+            'dcc_in': {}, 'dcc_out': {},
+        }
+        # regexp -> registration position. used to yield numeric and
+        # events_re matches in the events_re order. inserted regexps get
+        # negative positions
+        self.positions = {
+            'in': {}, 'out': {},
+            'dcc_in': {}, 'dcc_out': {},
+        }
+        self.first = self.last = 0
+        # regexp -> (config keys, values) used to compile templated regexps
+        self.templates = {
+            'in': {}, 'out': {},
+            'dcc_in': {}, 'dcc_out': {},
+        }
+        # events with an executor attribute. run by IrcObject.executors
+        self.offloaded = set()
+        # regexps where all events accept a lazy IrcMatch
+        self.lazy = {
+            'in': set(), 'out': set(),
+            'dcc_in': set(), 'dcc_out': set(),
+        }
+        # command -> callbacks receiving a parsed Message
+        self.commands = {
+            'in': defaultdict(list),
+            'out': defaultdict(list),
+        }
 
         self.scanned = []
         self.includes = set()
+        self.hooks = {}
 
         if reloading:
             self.reloading = self.plugins.copy()
@@ -43,12 +100,142 @@ class Registry:
             self.reloading = {}
             self.plugins = {}
 
+    def changed(self, iotype):
+        """Must be called each time events_re[iotype] is modified"""
+        self.matchers[iotype].dirty = True
+
+    def get_stamp(self, module):
+        """Return a stamp of the module source file or None"""
+        filename = getattr(module, '__file__', None)
+        if filename:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                return None
+            return filename, st.st_mtime, st.st_size
+
+    def get_scan(self, module, categories):
+        """Return the calls recorded when the module was scanned if its
+        source file did not change since"""
+        key = (module.__name__, tuple(categories))
+        stamp = self.get_stamp(module)
+        scan = self.scans.get(key)
+        if stamp is not None and scan is not None and scan[0] == stamp:
+            return scan[1]
+
+    def drop_scan(self, module, categories):
+        """Forget the scans of a module so it is scanned again"""
+        key = (module.__name__, tuple(categories))
+        self.scans.pop(key, None)
+        self.saved_scans.pop(key, None)
+
+    def record(self, *call):
+        """Record a call made while a module is scanned"""
+        if self.recording is not None:
+            self.recording.append(call)
+
+    def load_scans(self, filename):
+        """Read the scans written by :meth:`save_scans`. A missing or
+        unreadable file is an empty cache"""
+        try:
+            with open(filename) as fd:
+                data = json.load(fd)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or \
+                data.get('version') != SCAN_CACHE_VERSION:
+            return
+        for scan in data.get('scans', []):
+            key = (scan['module'], tuple(scan['categories']))
+            self.saved_scans[key] = (tuple(scan['stamp']), scan['calls'])
+
+    def save_scans(self, filename):
+        """Write the saved scans to filename"""
+        scans = [dict(module=module, categories=list(categories),
+                      stamp=list(stamp), calls=calls)
+                 for (module, categories), (stamp, calls)
+                 in sorted(self.saved_scans.items())]
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as fd:
+            json.dump(dict(version=SCAN_CACHE_VERSION, scans=scans), fd)
+        os.replace(tmp, filename)
+
+    def get_hooks(self, name):
+        """Return the plugins methods named ``name``. The table is built on
+        first use and dropped each time a plugin is registered"""
+        hooks = self.hooks.get(name)
+        if hooks is None:
+            hooks = self.hooks[name] = tuple(
+                getattr(p, name) for p in self.plugins.values()
+                if getattr(p, name, None) is not None)
+        return hooks
+
+    def stats(self):
+        """Return the hits per regexp for each iotype. Only the adaptive
+        engine records them"""
+        return {iotype: matcher.stats()
+                for iotype, matcher in self.matchers.items()}
+
+    def update_lazy(self, iotype, regexp):
+        """Events with a true ``lazy`` attribute receive an
+        :class:`~utils.IrcMatch` instead of a dict. It is only used when
+        all the events of a regexp are lazy"""
+        events = self.events[iotype].get(regexp)
+        if events and all(getattr(e, 'lazy', False) for e in events):
+            self.lazy[iotype].add(regexp)
+        else:
+            self.lazy[iotype].discard(regexp)
+
+    def get_splitter(self, regexp):
+        """Return the :class:`~matchers.NumericSplitter` of a retcode or
+        None"""
+        if isinstance(regexp, int):
+            splitter = matchers.NUMERICS.get(regexp)
+            if splitter is not None and splitter.re == regexp.re:
+                return splitter
+
+    def add_position(self, iotype, regexp, insert=False):
+        """Record the position of a new regexp"""
+        if insert:
+            self.first -= 1
+            self.positions[iotype][regexp] = self.first
+        else:
+            self.last += 1
+            self.positions[iotype][regexp] = self.last
+
     def get_event_matches(self, data, iotype='in'):
         events = self.events[iotype]
-        for regexp, cregexp in self.events_re[iotype]:
-            match = cregexp(data)
-            if match is not None:
-                yield match, events[regexp]
+        lazy = self.lazy[iotype]
+        entries = entry = None
+        numerics = self.numerics[iotype]
+        if numerics:
+            command = utils.get_command(data)
+            if command is not None and command.isdigit():
+                entries = numerics.get(int(command))
+        matcher = self.matchers[iotype]
+        if matcher.dirty:
+            matcher.build(self.events_re[iotype])
+        if entries:
+            # merge both sources by registration position
+            positions = self.positions[iotype]
+            entries = iter(entries)
+            entry = next(entries, None)
+        for regexp, match in matcher.get_matches(data):
+            if entry is not None:
+                position = positions[regexp]
+                while entry is not None and positions[entry[0]] < position:
+                    numeric_match = entry[1](data)
+                    if numeric_match is not None:
+                        yield numeric_match, events[entry[0]]
+                    entry = next(entries, None)
+            if regexp in lazy:
+                match = utils.IrcMatch(match)
+            yield match, events[regexp]
+        while entry is not None:
+            numeric_match = entry[1](data)
+            if numeric_match is not None:
+                yield numeric_match, events[entry[0]]
+            entry = next(entries, None)
 
 
 class IrcObject:
@@ -67,7 +254,26 @@ class IrcObject:
         testing=False,
         ssl=False,
         ssl_verify=False,
+        # client certificate. used by SASL EXTERNAL
+        ssl_certfile=None,
+        ssl_keyfile=None,
         encoding='utf8',
+        # 8191 bytes of IRCv3 tags + 512 bytes of message
+        max_line_length=8703,
+        # bytes buffered before outbound lines are written without waiting
+        # for the next loop iteration
+        max_write_buffer=4096,
+        event_engine='index',
+        batch_dispatch=False,
+        max_tasks=0,
+        max_event_tasks=0,
+        max_event_queue=1000,
+        queue_overflow='drop_oldest',
+        executor='thread',
+        executor_workers=4,
+        # json file keeping the plugins and events found in the included
+        # modules. unchanged modules are not scanned again on next start
+        scan_cache=None,
         loop=None,
     )
 
@@ -97,8 +303,27 @@ class IrcObject:
         # python 3.4.1 do not have a create_task method. check for it
         self.create_task = getattr(self.loop, 'create_task', self.create_task)
 
-        self.registry = Registry()
-
+        self.registry = Registry(engine=self.config.event_engine)
+        # ssl settings -> SSLContext reused by all connections
+        self.ssl_contexts = {}
+        # (host, port) -> last TLS session
+        self.ssl_sessions = {}
+        self.connecting_at = None
+        self.tasks = pool.TaskPool(
+            self,
+            max_tasks=self.config.max_tasks,
+            max_event_tasks=self.config.max_event_tasks,
+            max_queue=self.config.max_event_queue,
+            overflow=self.config.queue_overflow)
+        self.executors = pool.ExecutorPool(
+            self,
+            default=self.config.executor,
+            max_workers=self.config.executor_workers)
+        self.subscribe_core()
+
+        if self.config.scan_cache:
+            self.registry.load_scans(
+                os.path.expanduser(self.config.scan_cache))
         self.include(*self.config.get('includes', []))
 
     def create_task(self, coro):  # pragma: no cover
@@ -106,6 +331,7 @@ class IrcObject:
         return asyncio.async(coro, loop=self.loop)
 
     def get_plugin(self, ob):
+        self.registry.record(self.get_plugin, (ob,), {})
         plugins = self.registry.plugins
         includes = self.registry.includes
         reloading = self.registry.reloading
@@ -125,37 +351,94 @@ class IrcObject:
                 if dotted not in includes:
                     self.include(dotted)
             plugins[ob_name] = ob(self)
+            self.registry.hooks = {}
         elif ob_name in reloading and hasattr(ob, 'reload'):
                 instance = reloading.pop(ob_name)
                 if instance.__class__ is not ob:
                     self.log.debug("Reloading plugin '%s'", ob_name)
                     plugins[ob_name] = ob.reload(instance)
+                    self.registry.hooks = {}
         return plugins[ob_name]
 
+    def get_template_values(self, keys):
+        return tuple(self.config.get(key) for key in keys)
+
+    def compile_event(self, e):
+        """Compile the regexp of an event. Compiled regexps are cached by
+        template and by the config values interpolated in the template"""
+        reg = self.registry
+        regexp = getattr(e.regexp, 're', e.regexp)
+        keys = utils.template_keys(regexp)
+        if keys is None:
+            reg.templates[e.iotype][regexp] = (None, None)
+            return e.compile(self.config)
+        values = self.get_template_values(keys)
+        if keys:
+            reg.templates[e.iotype][regexp] = (keys, values)
+        key = (e.__class__, regexp, values)
+        try:
+            cregexp = reg.compiled.get(key)
+        except TypeError:  # unhashable config value
+            return e.compile(self.config)
+        if cregexp is None:
+            cregexp = reg.compiled[key] = e.compile(self.config)
+        return cregexp
+
     def recompile(self):
-        events_re = self.registry.events_re
-        for iotype in ('in', 'out'):
-            events = self.registry.events[iotype]
-            for i, (regexp, cregexp) in enumerate(events_re[iotype]):
-                e = events[regexp][0]
-                events_re[i] = (regexp, e.compile(self.config))
+        """Recompile the regexps using a config value which changed"""
+        reg = self.registry
+        for iotype, templates in reg.templates.items():
+            if not templates:
+                continue
+            events_re = reg.events_re[iotype]
+            events = reg.events[iotype]
+            changed = False
+            for i, (regexp, cregexp) in enumerate(events_re):
+                if regexp not in templates:
+                    continue
+                keys, values = templates[regexp]
+                if keys is not None:
+                    if values == self.get_template_values(keys):
+                        continue
+                events_re[i] = (regexp, self.compile_event(events[regexp][0]))
+                changed = True
+            if changed:
+                reg.changed(iotype)
 
     def attach_events(self, *events, **kwargs):
         """Attach one or more events to the bot instance"""
         reg = self.registry
+        reg.record(self.attach_events, events, kwargs)
         insert = 'insert' in kwargs
         for e in events:
-            cregexp = e.compile(self.config)
+            if getattr(e, 'executor', None):
+                self.executors.check(e.callback, e.executor)
             regexp = getattr(e.regexp, 're', e.regexp)
-            if regexp not in reg.events[e.iotype]:
+            splitter = reg.get_splitter(e.regexp)
+            if splitter is not None:
+                if regexp not in reg.events[e.iotype]:
+                    reg.add_position(e.iotype, regexp, insert)
+                    entries = reg.numerics[e.iotype].setdefault(
+                        int(e.regexp), [])
+                    if insert:
+                        entries.insert(0, (regexp, splitter))
+                    else:
+                        entries.append((regexp, splitter))
+            elif regexp not in reg.events[e.iotype]:
+                cregexp = self.compile_event(e)
+                reg.add_position(e.iotype, regexp, insert)
                 if insert:
                     reg.events_re[e.iotype].insert(0, (regexp, cregexp))
                 else:
                     reg.events_re[e.iotype].append((regexp, cregexp))
+                reg.changed(e.iotype)
             if insert:
                 reg.events[e.iotype][regexp].insert(0, e)
             else:
                 reg.events[e.iotype][regexp].append(e)
+            reg.update_lazy(e.iotype, regexp)
+            if getattr(e, 'executor', None):
+                reg.offloaded.add(e)
 
     def detach_events(self, *events):
         """Detach one or more events from the bot instance"""
@@ -171,38 +454,231 @@ class IrcObject:
                 all_events[e.iotype][regexp].remove(e)
                 if not all_events[iotype][regexp]:
                     del all_events[iotype][regexp]
+                    reg.templates[iotype].pop(regexp, None)
+                    reg.positions[iotype].pop(regexp, None)
                     # need to delete from self.events_re
                     delete[iotype].append(regexp)
+                reg.update_lazy(iotype, regexp)
+                reg.offloaded.discard(e)
 
         # delete from events_re
         for iotype, regexps in delete.items():
             reg.events_re[iotype] = [r for r in reg.events_re[iotype]
                                      if r[0] not in regexps]
+            reg.changed(iotype)
+            numerics = reg.numerics[iotype]
+            for numeric, entries in list(numerics.items()):
+                entries = [r for r in entries if r[0] not in regexps]
+                if entries:
+                    numerics[numeric] = entries
+                else:
+                    del numerics[numeric]
+
+    def subscribe_core(self):
+        """Subscribe the commands handled by the bot itself. Called each
+        time the registry is reset"""
+
+    def subscribe(self, command, *callbacks, **kwargs):
+        """Call callbacks with a parsed :class:`Message` each time a line
+        using command is received (or sent when iotype is ``out``).
+        Synchronous callbacks are run during the dispatch of the line so the
+        state they track is up to date for the next lines"""
+        subscribers = self.registry.commands[kwargs.get('iotype', 'in')]
+        subscribers[command.upper()].extend(
+            (callback, asyncio.iscoroutinefunction(callback))
+            for callback in callbacks)
+
+    def unsubscribe(self, command, *callbacks, **kwargs):
+        """Remove callbacks registered with :meth:`subscribe`"""
+        subscribers = self.registry.commands[kwargs.get('iotype', 'in')]
+        command = command.upper()
+        if command in subscribers:
+            subscribers[command] = [s for s in subscribers[command]
+                                    if s[0] not in callbacks]
+            if not subscribers[command]:
+                del subscribers[command]
 
     def include(self, *modules, **kwargs):
         reg = self.registry
         categories = kwargs.get('venusian_categories',
                                 self.venusian_categories)
         scanner = self.venusian.Scanner(context=self)
+        saved = False
         for module in modules:
             if module in reg.includes:
                 self.log.warn('%s included twice', module)
             else:
                 reg.includes.add(module)
                 module = utils.maybedotted(module)
-                # we have to manualy check for plugins. venusian no longer
-                # support to attach both a class and methods
-                for klass in list(module.__dict__.values()):
-                    if not isinstance(klass, type):
-                        continue
-                    if klass.__module__ == module.__name__:
-                        if getattr(klass, self.plugin_category, False) is True:
-                            self.get_plugin(klass)
+                calls = reg.get_scan(module, categories)
+                if calls is None:
+                    calls = self.load_scan(module, categories)
+                if calls is None:
+                    saved = self.scan(module, categories, scanner) or saved
+                else:
+                    # unchanged module. replay what the scan did
+                    recording, reg.recording = reg.recording, None
+                    try:
+                        for call, args, kwargs in calls:
+                            call(*args, **kwargs)
+                    finally:
+                        reg.recording = recording
                 reg.scanned.append((module.__name__, categories))
-                scanner.scan(module, categories=categories)
+        if saved and self.config.scan_cache:
+            filename = os.path.expanduser(self.config.scan_cache)
+            try:
+                reg.save_scans(filename)
+            except OSError as e:
+                self.log.warning('Not able to write %s: %s', filename, e)
+
+    def scan(self, module, categories, scanner):
+        """Register the plugins of a module and scan it with venusian.
+        Calls made to :meth:`get_plugin` and :meth:`attach_events` are
+        recorded so the scan can be skipped until the module change. Return
+        True when they can be written to the scan_cache file"""
+        reg = self.registry
+        recording, reg.recording = reg.recording, []
+        try:
+            # we have to manualy check for plugins. venusian no longer
+            # support to attach both a class and methods
+            for klass in list(module.__dict__.values()):
+                if not isinstance(klass, type):
+                    continue
+                if klass.__module__ == module.__name__:
+                    if getattr(klass, self.plugin_category, False) is True:
+                        self.get_plugin(klass)
+            scanner.scan(module, categories=categories)
+            stamp = reg.get_stamp(module)
+            if stamp is not None:
+                key = (module.__name__, tuple(categories))
+                reg.scans[key] = (stamp, reg.recording)
+                calls = self.dump_scan(reg.recording)
+                if calls is not None:
+                    reg.saved_scans[key] = (stamp, calls)
+                    return True
+                reg.saved_scans.pop(key, None)
+            return False
+        finally:
+            reg.recording = recording
+
+    def dump_scan(self, calls):
+        """Return the calls recorded by :meth:`scan` as json data. Classes
+        and functions are stored by name and bound methods by plugin and
+        method name. Return None if a call can't be stored"""
+        dumped = []
+        try:
+            for call, args, kwargs in calls:
+                if call.__name__ == 'get_plugin':
+                    dumped.append(['plugin', utils.dotted_name(args[0])])
+                else:
+                    dumped.append([
+                        'events', [self.dump_event(e) for e in args],
+                        self.dump_value(kwargs)])
+        except (TypeError, ValueError) as e:
+            self.log.debug('Scan not cached: %s', e)
+            return None
+        return dumped
+
+    def dump_event(self, e):
+        state = dict(vars(e))
+        callback = state.pop('callback')
+        owner = getattr(callback, '__self__', None)
+        if owner is not None:
+            name = utils.dotted_name(owner.__class__)
+            if self.registry.plugins.get(name) is not owner or \
+                    getattr(owner, callback.__name__, None) != callback:
+                raise ValueError('%r is not a plugin method' % callback)
+            callback = ['plugin', name, callback.__name__]
+        else:
+            callback = ['function', utils.dotted_name(callback)]
+        # rfc regexps are stored by name
+        raw = {}
+        for key, value in list(state.items()):
+            if isinstance(value, rfc.raw):
+                if self.load_raw(value.name) is not value:
+                    raise ValueError('%r is not a rfc regexp' % value)
+                raw[key] = state.pop(key).name
+        return dict(cls=utils.dotted_name(e.__class__), callback=callback,
+                    state=self.dump_value(state), raw=raw)
+
+    def dump_value(self, value):
+        """Return value if it's json data. Raise ValueError else"""
+        if value is None or value.__class__ in (bool, int, float, str):
+            return value
+        elif value.__class__ is list:
+            return [self.dump_value(v) for v in value]
+        elif value.__class__ is dict and \
+                all(key.__class__ is str for key in value):
+            return {key: self.dump_value(v) for key, v in value.items()}
+        raise ValueError('%r is not json data' % (value,))
+
+    def load_raw(self, name):
+        raw = getattr(rfc, name, None)
+        if not isinstance(raw, rfc.raw) and name.startswith('SERVER_'):
+            raw = getattr(getattr(rfc, name[7:], None), 'server', None)
+        if not isinstance(raw, rfc.raw):
+            raise LookupError('rfc.%s not found' % name)
+        return raw
+
+    def load_scan(self, module, categories):
+        """Return the calls of a scan read from the scan_cache file if the
+        module did not change since. Names are resolved now. Plugins are
+        created when the calls are replayed"""
+        reg = self.registry
+        key = (module.__name__, tuple(categories))
+        saved = reg.saved_scans.get(key)
+        stamp = reg.get_stamp(module)
+        if saved is None or stamp is None or saved[0] != stamp:
+            return None
+        calls = []
+        try:
+            for call in saved[1]:
+                if call[0] == 'plugin':
+                    calls.append(
+                        (self.get_plugin, (utils.maybedotted(call[1]),), {}))
+                else:
+                    events = tuple(self.load_event(e) for e in call[1])
+                    calls.append((self.attach_saved_events, events, call[2]))
+        except (LookupError, TypeError, ValueError) as e:
+            self.log.debug('Scanning %s again: %s', module.__name__, e)
+            reg.saved_scans.pop(key, None)
+            return None
+        reg.scans[key] = (stamp, calls)
+        return calls
+
+    def load_event(self, data):
+        """Return an event rebuilt from :meth:`dump_event` data and the
+        plugin class and method name of its callback if it has one"""
+        cls = utils.maybedotted(data['cls'])
+        e = cls.__new__(cls)
+        vars(e).update(copy.deepcopy(data['state']))
+        for key, name in data['raw'].items():
+            setattr(e, key, self.load_raw(name))
+        kind, name = data['callback'][:2]
+        if kind == 'plugin':
+            plugin = utils.maybedotted(name)
+            method = data['callback'][2]
+            if not callable(getattr(plugin, method, None)):
+                raise LookupError('%s.%s not found' % (name, method))
+            return e, (plugin, method)
+        e.callback = utils.maybedotted(name)
+        return e, None
+
+    def attach_saved_events(self, *events, **kwargs):
+        """Attach events returned by :meth:`load_event`. Callbacks are bound
+        to the plugin instances of this bot"""
+        attached = []
+        for e, method in events:
+            if method is not None:
+                plugin, name = method
+                e.callback = getattr(self.get_plugin(plugin), name)
+            attached.append(e)
+        self.attach_events(*attached, **kwargs)
 
     def reload(self, *modules):
-        """Reload one or more plugins"""
+        """Reload one or more plugins. Named modules are always reimported.
+        Without names, all the included modules are rescanned but only the
+        ones whose source file changed are reimported"""
         self.notify('before_reload')
 
         if 'configfiles' in self.config:
@@ -213,18 +689,23 @@ class IrcObject:
             self.config.update(cfg)
 
         self.log.info('Reloading python code...')
-        if not modules:
+        named = bool(modules)
+        if not named:
             modules = self.registry.includes
         scanned = list(reversed(self.registry.scanned))
 
         # reset includes and events
         self.registry.reset()
+        self.subscribe_core()
 
         to_scan = []
         for module, categories in scanned:
             if module in modules:
                 module = utils.maybedotted(module)
-                module = reload_module(module)
+                if named or \
+                        self.registry.get_scan(module, categories) is None:
+                    self.registry.drop_scan(module, categories)
+                    module = reload_module(module)
             to_scan.append((module, categories))
 
         # rescan all modules
@@ -236,31 +717,86 @@ class IrcObject:
         self.notify('after_reload')
 
     def notify(self, event, exc=None, client=None):
-        for p in self.registry.plugins.values():
-            meth = getattr(p, event, None)
-            if meth is not None:
-                if client is not None:
-                    meth(client=client)
-                else:
-                    meth()
-
-    def dispatch(self, data, iotype='in', client=None):
+        for meth in self.registry.get_hooks(event):
+            if client is not None:
+                meth(client=client)
+            else:
+                meth()
+
+    def dispatch(self, data, iotype='in', client=None, call_soon=None):
+        """Run the callbacks matching data. Synchronous command subscribers
+        are run now, other synchronous callbacks are scheduled with
+        call_soon. Return the call_soon to use for the next
+        lines: once a coroutine is started callbacks are scheduled with the
+        loop so they keep running in the order of the lines"""
         str = utils.IrcString
+        IrcMatch = utils.IrcMatch
         create_task = self.create_task
-        call_soon = self.loop.call_soon
-        for match, events in self.registry.get_event_matches(data, iotype):
-            match = match.groupdict()
-            for key, value in match.items():
-                if value is not None:
-                    match[key] = str(value)
+        call_callback = self.call_callback
+        submit = self.tasks.submit
+        offloaded = self.registry.offloaded
+        loop_call_soon = self.loop.call_soon
+        if call_soon is None:
+            call_soon = loop_call_soon
+        line = data
+        if data[:1] == '@':
+            # IRCv3 tags are only available to command subscribers
+            line = data[data.find(' ') + 1:].lstrip(' ')
+        subscribers = self.registry.commands.get(iotype)
+        if subscribers:
+            command = utils.get_command(line)
+            callbacks = command and subscribers.get(command.upper())
+            if callbacks:
+                # only parse the lines someone subscribed to
+                message = Message.parse(data)
+                for callback, iscoroutine in callbacks:
+                    if iscoroutine is True:
+                        create_task(callback(message))
+                        call_soon = loop_call_soon
+                    else:
+                        call_callback(callback, message)
+        for match, events in self.registry.get_event_matches(line, iotype):
+            # retcode params are a dict of IrcString
+            if match.__class__ is not IrcMatch and match.__class__ is not dict:
+                match = match.groupdict()
+                for key, value in match.items():
+                    if value is not None:
+                        match[key] = str(value)
             if client is not None:
                 # server / dcc chat
                 match['client'] = client
             for e in events:
                 if e.iscoroutine is True:
-                    create_task(e.callback(**match))
+                    submit(e, match)
+                    call_soon = loop_call_soon
+                elif e in offloaded:
+                    self.executors.submit(e, match)
                 else:
                     call_soon(e.async_callback, match)
+        return call_soon
+
+    def dispatch_many(self, lines, iotype='in', client=None):
+        """Dispatch lines in a single event loop callback. Callbacks are run
+        in the same order than with :meth:`dispatch`"""
+        if lines:
+            self.loop.call_soon(
+                self.dispatch_batch, lines, iotype, client)
+
+    def dispatch_batch(self, lines, iotype='in', client=None):
+        """Synchronous callbacks are run inline until a coroutine is started.
+        The next ones are scheduled after it, like :meth:`dispatch` does"""
+        call = self.call_callback
+        dispatch = self.dispatch
+        for line in lines:
+            call = dispatch(line, iotype, client, call_soon=call)
+
+    def call_callback(self, callback, *args):
+        """Run a callback now. Errors are logged like the loop does for
+        scheduled callbacks"""
+        try:
+            callback(*args)
+        except Exception as e:
+            self.log.exception(e)
 
     def call_many(self, callback, args):
         """callback is run with each arg but run a call per second"""
@@ -274,26 +810,58 @@ class IrcObject:
         call_later(i + 1, f.set_result, True)
         return f
 
-    def get_ssl_context(self):
-        if self.config.ssl:  # pragma: no cover
-            try:
-                create_default_context = ssl.create_default_context
-            except AttributeError:  # py < 2.7.9
-                return True
-            else:
-                if self.server:
-                    context = create_default_context(ssl.Purpose.SERVER_AUTH)
-                else:
-                    context = create_default_context(ssl.Purpose.CLIENT_AUTH)
-                verify_mode = self.config.ssl_verify
-                if verify_mode is not False:
-                    if not isinstance(verify_mode, int):
-                        # CERT_NONE / CERT_OPTIONAL / CERT_REQUIRED
-                        verify_mode = getattr(ssl, verify_mode.upper())
-                    context.verify_mode = verify_mode
-                return context
+    def get_ssl_context(self, server=None):
+        """Return the SSLContext of the current ssl settings. It is built
+        once and offers the last TLS session used with server"""
+        if self.config.ssl:
+            key = (self.server, self.config.ssl_verify,
+                   self.config.ssl_certfile, self.config.ssl_keyfile)
+            context = self.ssl_contexts.get(key)
+            if context is None:
+                context = self.ssl_contexts[key] = self.create_ssl_context()
+            if isinstance(context, utils.SSLContext):
+                context.session = self.ssl_sessions.get(server)
+            return context
         return None
 
+    def create_ssl_context(self):
+        try:
+            create_default_context = ssl.create_default_context
+        except AttributeError:  # pragma: no cover
+            # py < 2.7.9
+            return True
+        else:
+            if self.server:  # pragma: no cover
+                context = create_default_context(ssl.Purpose.CLIENT_AUTH)
+            elif hasattr(ssl.SSLObject, 'session'):
+                # same defaults as create_default_context(SERVER_AUTH) but
+                # able to resume sessions
+                context = utils.SSLContext(ssl.PROTOCOL_TLS)
+                context.options |= (ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 |
+                                    ssl.OP_NO_COMPRESSION)
+                context.verify_mode = ssl.CERT_REQUIRED
+                context.check_hostname = True
+                context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+            else:  # pragma: no cover
+                context = create_default_context(ssl.Purpose.SERVER_AUTH)
+            verify_mode = self.config.ssl_verify
+            if verify_mode is False:
+                verify_mode = ssl.CERT_NONE
+            elif not isinstance(verify_mode, int):
+                # CERT_NONE / CERT_OPTIONAL / CERT_REQUIRED
+                verify_mode = getattr(ssl, verify_mode.upper())
+            if verify_mode == ssl.CERT_NONE:
+                context.check_hostname = False
+            context.verify_mode = verify_mode
+            if self.config.ssl_certfile:
+                context.load_cert_chain(self.config.ssl_certfile,
+                                        self.config.ssl_keyfile)
+            return context
+
+    def get_server(self):
+        """Return the (host, port) to connect to"""
+        return self.config.host, self.config.port
+
     def create_connection(self):
         protocol = utils.maybedotted(self.config.connection)
         protocol = type(protocol.__name__, (protocol,), {'factory': self})
@@ -303,10 +871,12 @@ class IrcObject:
         else:
             self.log.debug('Starting {nick}...'.format(**self.config))
             factory = self.loop.create_connection
+        host, port = self.get_server()
+        self.connecting_at = self.loop.time()
         t = asyncio.Task(
             factory(
-                protocol, self.config.host,
-                self.config.port, ssl=self.get_ssl_context()),
+                protocol, host,
+                port, ssl=self.get_ssl_context((host, port))),
             loop=self.loop)
         t.add_done_callback(self.connection_made)
         return self.loop
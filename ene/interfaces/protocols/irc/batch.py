@@ -0,0 +1,79 @@
+"""IRCv3 batches"""
+from .message import Message
+from .message import parse_tags
+
+
+class Batch:
+    """Lines received between ``BATCH +ref`` and ``BATCH -ref``. Nested
+    batches are merged in their parent and listed in ``batches``"""
+
+    __slots__ = ('ref', 'type', 'params', 'tags', 'parent', 'lines',
+                 'batches', '_messages')
+
+    def __init__(self, ref, type, params=None, tags=None, parent=None):
+        self.ref = ref
+        self.type = type
+        self.params = params if params is not None else []
+        self.tags = tags
+        self.parent = parent
+        self.lines = []
+        self.batches = []
+        self._messages = None
+
+    @property
+    def messages(self):
+        """lines parsed as :class:`~message.Message`"""
+        if self._messages is None:
+            self._messages = [Message.parse(line) for line in self.lines]
+        return self._messages
+
+    def __repr__(self):
+        return '<Batch %s %s (%d lines)>' % (
+            self.ref, self.type, len(self.lines))
+
+
+class Batches:
+    """Hold the lines of open batches until the batch is complete"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # ref -> open Batch
+        self.open = {}
+
+    def feed(self, data):
+        """return True when data is held by a batch and the
+        :class:`Batch` when data completes a top level batch"""
+        if 'BATCH ' in data:
+            message = Message.parse(data)
+            if message.command == 'BATCH' and message.params:
+                return self.batch_received(message)
+        if data[:1] == '@' and self.open:
+            tags = data[1:data.find(' ')]
+            if 'batch=' in tags:
+                batch = self.open.get(parse_tags(tags).get('batch'))
+                if batch is not None:
+                    batch.lines.append(data)
+                    return True
+        return False
+
+    def batch_received(self, message):
+        ref = message.params[0]
+        if ref[:1] == '+' and len(message.params) > 1:
+            tags = message.tags or {}
+            self.open[ref[1:]] = Batch(
+                ref[1:], message.params[1], message.params[2:],
+                tags=message.tags, parent=tags.get('batch'))
+            return True
+        elif ref[:1] == '-':
+            batch = self.open.pop(ref[1:], None)
+            if batch is None:
+                return False
+            parent = self.open.get(batch.parent)
+            if parent is not None:
+                parent.lines.extend(batch.lines)
+                parent.batches.append(batch)
+                return True
+            return batch
+        return False
@@ -0,0 +1,148 @@
+"""IRCv3 capability negotiation and SASL authentication"""
+import base64
+
+# requested by default. see http://ircv3.net/irc/
+DEFAULT_CAPS = (
+    'multi-prefix',
+    'userhost-in-names',
+    'message-tags',
+    'server-time',
+    'batch',
+)
+SASL_MECHANISMS = ('PLAIN', 'EXTERNAL')
+# AUTHENTICATE payloads are sent in chunks of 400 bytes
+SASL_CHUNK = 400
+
+
+class Capabilities:
+    """Request the ``wanted`` capabilities before registration and
+    authenticate with SASL when a mechanism is given. Registration is held
+    by the server until ``CAP END`` is sent so the bot is identified by
+    the time RPL_WELCOME arrives"""
+
+    def __init__(self, context, wanted=(), mechanism=None, username=None,
+                 password=None):
+        if mechanism is not None:
+            mechanism = mechanism.upper()
+            if mechanism not in SASL_MECHANISMS:
+                raise ValueError('Invalid SASL mechanism %r' % mechanism)
+        self.context = context
+        self.wanted = set(wanted)
+        self.mechanism = mechanism
+        self.username = username
+        self.password = password
+        if mechanism is not None:
+            self.wanted.add('sasl')
+        self.reset()
+
+    def reset(self):
+        # name -> value announced by CAP LS
+        self.available = {}
+        self.enabled = set()
+        self.negotiating = False
+        self.authenticated = False
+
+    def get_registration(self):
+        """lines sent before PASS/NICK/USER"""
+        if self.wanted:
+            self.negotiating = True
+            return ['CAP LS 302']
+        return []
+
+    def end(self):
+        if self.negotiating:
+            self.negotiating = False
+            self.context.send('CAP END')
+
+    def cap_received(self, message):
+        """CAP subscriber"""
+        params = message.params
+        if len(params) < 2:
+            return
+        subcommand = params[1].upper()
+        more = len(params) > 2 and params[2] == '*'
+        caps = (message.trailing or '').split()
+        if subcommand == 'LS':
+            for cap in caps:
+                name, _, value = cap.partition('=')
+                self.available[name] = value
+            if not more and self.negotiating:
+                self.request()
+        elif subcommand == 'ACK':
+            for cap in caps:
+                if cap.startswith('-'):
+                    self.enabled.discard(cap[1:])
+                else:
+                    self.enabled.add(cap)
+            if not more and self.negotiating:
+                self.acknowledged()
+        elif subcommand == 'NAK':
+            self.context.log.warning('Capabilities refused: %s',
+                                     ' '.join(caps))
+            if self.negotiating:
+                self.acknowledged()
+        elif subcommand == 'NEW':
+            names = []
+            for cap in caps:
+                name, _, value = cap.partition('=')
+                self.available[name] = value
+                if name in self.wanted and name not in self.enabled:
+                    names.append(name)
+            if names:
+                self.context.send('CAP REQ :' + ' '.join(names))
+        elif subcommand == 'DEL':
+            for cap in caps:
+                self.available.pop(cap, None)
+                self.enabled.discard(cap)
+
+    def request(self):
+        caps = sorted(self.wanted.intersection(self.available))
+        if self.mechanism is not None and 'sasl' in caps:
+            # sasl=PLAIN,EXTERNAL in CAP LS 302
+            mechanisms = self.available['sasl']
+            if mechanisms and self.mechanism not in mechanisms.split(','):
+                self.context.log.warning(
+                    'SASL %s not supported by the server', self.mechanism)
+                caps.remove('sasl')
+        if caps:
+            self.context.send('CAP REQ :' + ' '.join(caps))
+        else:
+            self.end()
+
+    def acknowledged(self):
+        if self.mechanism is not None and 'sasl' in self.enabled:
+            self.context.send('AUTHENTICATE ' + self.mechanism)
+        else:
+            self.end()
+
+    def get_payload(self):
+        if self.mechanism == 'EXTERNAL':
+            return b''
+        username = (self.username or self.context.nick).encode('utf8')
+        password = (self.password or '').encode('utf8')
+        return b'\0'.join((username, username, password))
+
+    def authenticate_received(self, message):
+        """AUTHENTICATE subscriber"""
+        data = message.params[0] if message.params else message.trailing
+        if data != '+':
+            return
+        payload = base64.b64encode(self.get_payload()).decode('ascii')
+        send = self.context.send
+        for i in range(0, len(payload), SASL_CHUNK):
+            send('AUTHENTICATE ' + payload[i:i + SASL_CHUNK])
+        if len(payload) % SASL_CHUNK == 0:
+            # empty or last chunk of exactly 400 bytes
+            send('AUTHENTICATE +')
+
+    def sasl_succeeded(self, message):
+        """RPL_SASLSUCCESS subscriber"""
+        self.authenticated = True
+        self.context.log.info('Authenticated with SASL %s', self.mechanism)
+        self.end()
+
+    def sasl_failed(self, message):
+        """ERR_SASLFAIL and friends subscriber"""
+        self.context.log.warning('SASL %s authentication failed: %s',
+                                 self.mechanism, message.trailing)
+        self.end()
@@ -1,6 +1,6 @@
-import time
 import asyncio
 import venusian
+import weakref
 from collections import deque
 from ipaddress import ip_address
 from .dcc import DCCManager
@@ -8,6 +8,12 @@ from .dcc import DCCChat
 from . import config
 from . import utils
 from . import base
+from . import pool
+from . import scheduler
+from . import lag
+from . import backoff
+from . import cap
+from . import batch
 # from .dec import dcc_event
 # from .dec import event
 # from .dec import extend
@@ -23,8 +29,14 @@ class IrcProtocol(asyncio.Protocol):
         Initialize a new IRC connection
         """
         self.transport = None
+        self.server = None
         self.closed = True
-        self.queue = None
+        self.lost = None
+        self.framer = None
+        # encoded chunks waiting for the next flush
+        self.outbound = []
+        self.outbound_size = 0
+        self.flush_handle = None
 
     def connection_made(self, transport):
         """
@@ -33,7 +45,9 @@ class IrcProtocol(asyncio.Protocol):
         """
         self.transport = transport
         self.closed = False
-        self.queue = deque()
+        self.lost = asyncio.Future(loop=self.factory.loop)
+        self.framer = utils.LineFramer(
+            self.factory.encoding, self.factory.config.max_line_length)
 
     def decode(self, data):
         """
@@ -50,15 +64,16 @@ class IrcProtocol(asyncio.Protocol):
         AsyncIO data received event
         @param  data:   bytes
         """
-        data = self.decode(data)
+        if self.factory.closing:
+            return
+        self.factory.lag.received()
+        lines = self.framer.feed(data)
 
-        if self.queue:
-            data = self.queue.popleft() + data
-        lines = data.split('\r\n')
-        self.queue.append(lines.pop(-1))
-
-        for line in lines:
-            self.factory.dispatch(line)
+        if self.factory.config.batch_dispatch:
+            self.factory.dispatch_many(lines)
+        else:
+            for line in lines:
+                self.factory.dispatch(line)
 
     def encode(self, data):
         """
@@ -71,14 +86,35 @@ class IrcProtocol(asyncio.Protocol):
 
     def write(self, data):
         """
-        Write data to the transport stream
+        Buffer data for the transport stream. The buffer is flushed at the
+        next loop iteration or as soon as it reaches max_write_buffer bytes
         @param  data:   str or bytes
         """
         if data is not None:
             data = self.encode(data)
+            outbound = self.outbound
+            outbound.append(data)
+            self.outbound_size += len(data)
             if not data.endswith(b'\r\n'):
-                data = data + b'\r\n'
-            self.transport.write(data)
+                outbound.append(b'\r\n')
+                self.outbound_size += 2
+            if self.outbound_size >= self.factory.config.max_write_buffer:
+                self.flush()
+            elif self.flush_handle is None:
+                self.flush_handle = self.factory.loop.call_soon(self.flush)
+
+    def flush(self):
+        """
+        Write the buffered lines to the transport stream now
+        """
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.outbound:
+            outbound, self.outbound = self.outbound, []
+            self.outbound_size = 0
+            if not self.closed:
+                self.transport.writelines(outbound)
 
     def connection_lost(self, exc):
         """
@@ -88,12 +124,14 @@ class IrcProtocol(asyncio.Protocol):
                                   id(self.transport),
                                   exc)
         self.factory.notify('connection_lost')
+        self.factory.lag.stop()
+        if self.lost is not None and not self.lost.done():
+            self.lost.set_result(exc)
         if not self.closed:
             self.closed = True
+            self.flush()
             self.close()
-            # wait a few before reconnect
-            self.factory.loop.call_later(
-                2, self.factory.create_connection)
+            self.factory.reconnect()
 
     def close(self):
         """
@@ -102,6 +140,7 @@ class IrcProtocol(asyncio.Protocol):
         if not self.closed:
             self.factory.log.critical('closing old transport (%r)',
                                       id(self.transport))
+            self.flush()
             try:
                 self.transport.close()
             finally:
@@ -146,8 +185,35 @@ class Irc(base.IrcObject):
             CHANMODES='eIbq,k,flj,CFLMPQScgimnprstz',
         ),
         connection=IrcProtocol,
+        # flood control. lines sent at once then lines per second
+        flood_burst=5,
+        flood_rate=1.,
+        # seconds between two lag checks
+        ping_interval=60,
+        # host[:port] entries tried in turn. host and port when empty
+        servers=[],
+        # reconnect delays. see backoff.Backoff
+        reconnect_base=1.,
+        reconnect_cap=300.,
+        reconnect_reset=60.,
+        # max seconds spent to drain outbound lines and quit on shutdown
+        shutdown_timeout=5.,
+        # channels joined once registered. on RPL_WELCOME (001) or on MOTD
+        # end (376/422) when autojoin_on is 'motd'
+        autojoins=[],
+        autojoin_on='001',
+        # IRCv3 capabilities requested before registration
+        caps=list(cap.DEFAULT_CAPS),
+        # SASL authentication during capability negotiation. PLAIN or
+        # EXTERNAL (with ssl_certfile). sasl_username defaults to the nick
+        sasl_mechanism=None,
+        sasl_username=None,
+        sasl_password=None,
     )
 
+    # running instances. SIGINT shutdown all the ones using the same loop
+    instances = weakref.WeakSet()
+
     def __init__(self, *ini, **config):
         """
         Initialize a new IRC instance
@@ -155,6 +221,216 @@ class Irc(base.IrcObject):
         super(Irc, self).__init__(*ini, **config)
         self._ip = self._dcc = None
         self.protocol = None
+        self.closing = False
+        self.instances.add(self)
+        # recent connections: server, duration (including TLS handshake)
+        # and whether the TLS session was resumed
+        self.handshakes = deque(maxlen=100)
+        self.batches = batch.Batches()
+        self.capabilities = cap.Capabilities(
+            self,
+            wanted=utils.as_list(self.config.caps),
+            mechanism=self.config.sasl_mechanism,
+            username=self.config.sasl_username,
+            password=self.config.sasl_password)
+        self.connected_at = None
+        # autojoins not joined yet
+        self.joining = set()
+        # seconds from TCP connect to the last autojoin
+        self.time_to_ready = None
+        # our nick!user@host as seen by the server once known
+        self.hostmask = None
+        self.scheduler = scheduler.Scheduler(
+            self.loop, self.write,
+            burst=self.config.flood_burst, rate=self.config.flood_rate)
+        self.lag = lag.LagMonitor(
+            self,
+            interval=self.config.ping_interval,
+            max_lag=self.config.max_lag,
+            timeout=self.config.timeout)
+        servers = [backoff.parse_server(server, self.config.port)
+                   for server in utils.as_list(self.config.servers)]
+        self.backoff = backoff.Backoff(
+            self.loop,
+            servers or [(self.config.host, self.config.port)],
+            base=self.config.reconnect_base,
+            cap=self.config.reconnect_cap,
+            reset_after=self.config.reconnect_reset)
+
+    def subscribe_core(self):
+        """
+        Subscribe to the commands the bot needs to track its own state
+        """
+        self.subscribe('NICK', self.nick_changed)
+        self.subscribe('PING', self.ping_received)
+        self.subscribe('005', self.isupport_received)
+        self.subscribe('JOIN', self.join_received)
+        self.subscribe('001', self.welcome_received)
+        self.subscribe('376', self.motd_received)
+        self.subscribe('422', self.motd_received)
+        # ERR_NOSUCHCHANNEL, ERR_TOOMANYCHANNELS, ERR_CHANNELISFULL,
+        # ERR_INVITEONLYCHAN, ERR_BANNEDFROMCHAN, ERR_BADCHANNELKEY
+        for command in ('403', '405', '471', '473', '474', '475'):
+            self.subscribe(command, self.join_failed)
+        self.subscribe('CAP', self.cap_received)
+        self.subscribe('AUTHENTICATE', self.authenticate_received)
+        # RPL_SASLSUCCESS
+        self.subscribe('903', self.sasl_succeeded)
+        # ERR_NICKLOCKED, ERR_SASLFAIL, ERR_SASLTOOLONG, ERR_SASLABORTED,
+        # ERR_SASLALREADY
+        for command in ('902', '904', '905', '906', '907'):
+            self.subscribe(command, self.sasl_failed)
+        self.subscribe('PONG', self.pong_received)
+
+    def nick_changed(self, message):
+        """
+        Update our nick and recompile the regexps using it when we are renamed
+        @type   message:    message.Message
+        """
+        prefix = message.prefix
+        if prefix and prefix.lnick == self.config.nick.lower():
+            new_nick = message.trailing or message.params[0]
+            self.log.debug('Nick changed to %s', new_nick)
+            self.config['nick'] = new_nick
+            self.recompile()
+
+    def ping_received(self, message):
+        """
+        Answer server pings right away
+        @type   message:    message.Message
+        """
+        data = message.trailing
+        if data is None:
+            data = message.params[0] if message.params else ''
+        self.send(utils.build_line(b'PONG :', data, encoding=self.encoding),
+                  flush=True)
+
+    def pong_received(self, message):
+        """
+        Measure the lag from our own PINGs
+        @type   message:    message.Message
+        """
+        self.lag.pong_received(message)
+
+    def cap_received(self, message):
+        """
+        Capability negotiation
+        @type   message:    message.Message
+        """
+        self.capabilities.cap_received(message)
+
+    def authenticate_received(self, message):
+        """
+        SASL challenge
+        @type   message:    message.Message
+        """
+        self.capabilities.authenticate_received(message)
+
+    def sasl_succeeded(self, message):
+        """
+        @type   message:    message.Message
+        """
+        self.capabilities.sasl_succeeded(message)
+
+    def sasl_failed(self, message):
+        """
+        @type   message:    message.Message
+        """
+        self.capabilities.sasl_failed(message)
+
+    def dispatch(self, data, iotype='in', client=None, call_soon=None):
+        # lines of an open batch are dispatched once the batch is complete
+        if iotype == 'in':
+            held = self.batches.feed(data)
+            if held is True:
+                return call_soon
+            elif held:
+                return self.batch_received(held, call_soon)
+        return super(Irc, self).dispatch(data, iotype, client, call_soon)
+
+    def batch_received(self, batch, call_soon=None):
+        """
+        Deliver a complete batch to the plugins batch_received methods. Its
+        lines are dispatched one by one if no plugin handles batches. Both
+        happen in the current dispatch pass so the lines received after the
+        batch come next
+        @type   batch:      batch.Batch
+        @rtype:             callable
+        """
+        hooks = self.registry.get_hooks('batch_received')
+        if hooks:
+            call = call_soon or self.loop.call_soon
+            for meth in hooks:
+                call(meth, batch)
+            return call_soon
+        dispatch = super(Irc, self).dispatch
+        for line in batch.lines:
+            call_soon = dispatch(line, call_soon=call_soon)
+        return call_soon
+
+    def isupport_received(self, message):
+        """
+        Store the server features announced with RPL_ISUPPORT (005)
+        @type   message:    message.Message
+        """
+        server_config = dict(self.config.server_config)
+        for token in message.params[1:]:
+            if token.startswith('-'):
+                server_config.pop(token[1:], None)
+            else:
+                key, _, value = token.partition('=')
+                server_config[key] = value
+        self.config['server_config'] = server_config
+
+    def join_received(self, message):
+        """
+        Learn our hostmask from our own joins
+        @type   message:    message.Message
+        """
+        prefix = message.prefix
+        if (prefix and '@' in prefix and
+                prefix.lnick == self.config.nick.lower()):
+            self.hostmask = prefix
+            channel = message.params[0] if message.params else message.trailing
+            self.join_done(channel)
+
+    def get_max_length(self, command, target):
+        """
+        Return the bytes available for the text of a message once relayed
+        by the server as ``:nick!user@host <command> <target> :<text>``
+        @type   command:    str
+        @type   target:     str
+        @rtype:             int
+        """
+        hostmask = self.hostmask
+        if hostmask is None or hostmask.nick != self.config.nick:
+            # nick!~user@host with the usual USERLEN and HOSTLEN
+            server_config = self.server_config
+            hostmask = '%s!%s@%s' % (
+                self.config.nick,
+                'u' * (int(server_config.get('USERLEN') or 10) + 1),
+                'h' * int(server_config.get('HOSTLEN') or 63))
+        overhead = len(':{0} {1} {2} :\r\n'.format(
+            hostmask, command, target).encode(self.encoding))
+        return min(self.config.max_length, 512 - overhead)
+
+    def get_max_targets(self, command):
+        """
+        Return the number of targets allowed for a command by TARGMAX or
+        MAXTARGETS. 0 means no limit
+        @type   command:    str
+        @rtype:             int
+        """
+        server_config = self.server_config
+        targmax = server_config.get('TARGMAX')
+        if targmax:
+            for item in targmax.split(','):
+                name, _, value = item.partition(':')
+                if name.upper() == command:
+                    return int(value) if value else 0
+            return 1
+        value = server_config.get('MAXTARGETS')
+        return int(value) if value else 1
 
     @property
     def server_config(self):
@@ -181,27 +457,184 @@ class Irc(base.IrcObject):
             transport, protocol = f.result()
         except Exception as e:
             self.log.exception(e)
-            self.loop.call_later(3, self.create_connection)
+            self.reconnect(failed=True)
         else:
             self.log.debug('Connected')
+            self.backoff.connected()
+            self.connected(protocol)
             self.protocol = protocol
-            self.protocol.queue = deque()
             self.protocol.factory = self
             self.protocol.encoding = self.encoding
+            self.scheduler.reset()
+            self.lag.start()
+            self.register()
+            self.notify('connection_made')  # fire connection made events
 
-            # Do we need to send a server password?
-            if self.config.get('password'):
-                self._send('PASS {password}'.format(**self.config))
+    def get_registration(self):
+        """
+        Return the lines sent to register the connection
+        @rtype: list
+        """
+        lines = self.capabilities.get_registration()
+        # Do we need to send a server password?
+        if self.config.get('password'):
+            lines.append('PASS {password}'.format(**self.config))
+        # Set our identity and nick information
+        lines.append('NICK {nick}'.format(**self.config))
+        lines.append(
+            'USER {realname} {host} {host} :{userinfo}'.format(**self.config))
+        return lines
 
-            # Set our identity and nick information
-            self.send((
-                'USER {realname} {host} {host} :{userinfo}\r\n'
-                'NICK {nick}\r\n'
-            ).format(**self.config))
+    def register(self):
+        """
+        Send the registration lines in a single write
+        """
+        self.time_to_ready = None
+        self.joining = set()
+        self.capabilities.reset()
+        self.batches.reset()
+        lines = self.get_registration()
+        for line in lines[:-1]:
+            self.write(line)
+        self.write(lines[-1], flush=True)
 
-            self.notify('connection_made')  # fire connection made events
-            self.join('#homestead')
-            self.privmsg('#homestead', 'Hello, world!')
+    def welcome_received(self, message):
+        """
+        Join our channels once registered (RPL_WELCOME)
+        @type   message:    message.Message
+        """
+        self.log.debug('Registered in %.3fs',
+                       self.loop.time() - self.connected_at)
+        if self.config.autojoin_on != 'motd':
+            self.autojoin()
+
+    def motd_received(self, message):
+        """
+        Join our channels at the end of the MOTD when configured to
+        @type   message:    message.Message
+        """
+        if self.config.autojoin_on == 'motd':
+            self.autojoin()
+
+    def autojoin(self):
+        """
+        Join the autojoins channels with as few lines as possible
+        """
+        channels = utils.as_list(self.config.autojoins)
+        if not channels:
+            self.ready()
+            return
+        self.joining = {channel.lower() for channel in channels}
+        chantypes = self.server_config.get('CHANTYPES', '#&')
+        keyed = []
+        free = []
+        for channel in channels:
+            key = self.config.passwords.get(channel.strip(chantypes))
+            if key:
+                keyed.append((channel, key))
+            else:
+                free.append((channel, None))
+        line = []
+        keys = []
+        length = 0
+        # keyed channels must come first
+        for channel, key in keyed + free:
+            size = len(channel.encode(self.encoding)) + 1
+            if key:
+                size += len(key.encode(self.encoding)) + 1
+            # 512 bytes minus 'JOIN ', the keys separator and CRLF
+            if line and length + size > 504:
+                self.send(' '.join(['JOIN', ','.join(line)] +
+                                   ([','.join(keys)] if keys else [])))
+                line = []
+                keys = []
+                length = 0
+            line.append(channel)
+            if key:
+                keys.append(key)
+            length += size
+        self.send(' '.join(['JOIN', ','.join(line)] +
+                           ([','.join(keys)] if keys else [])))
+
+    def join_done(self, channel):
+        """
+        Forget a joined (or refused) autojoin channel
+        @type   channel:    str
+        """
+        joining = self.joining
+        if joining:
+            joining.discard(channel.lower())
+            if not joining:
+                self.ready()
+
+    def join_failed(self, message):
+        """
+        Forget an autojoin channel we could not join
+        @type   message:    message.Message
+        """
+        if len(message.params) > 1:
+            self.join_done(message.params[1])
+
+    def ready(self):
+        """
+        Record the time from TCP connect to the last autojoin
+        """
+        self.time_to_ready = self.loop.time() - self.connected_at
+        self.log.info('Ready in %.3fs', self.time_to_ready)
+
+    def connected(self, protocol):
+        """
+        Record how long it took to connect
+        @type   protocol:   IrcProtocol
+        """
+        self.connected_at = self.loop.time()
+        duration = self.connected_at - self.connecting_at
+        protocol.server = self.get_server()
+        ssl_object = protocol.transport.get_extra_info('ssl_object')
+        reused = bool(getattr(ssl_object, 'session_reused', False))
+        server = '%s:%s' % protocol.server
+        self.handshakes.append(dict(
+            server=server, duration=duration,
+            tls=ssl_object is not None, reused=reused))
+        if ssl_object is not None:
+            self.log.info('TLS connection to %s in %.3fs (session %s)',
+                          server, duration, 'resumed' if reused else 'new')
+
+    def save_ssl_session(self):
+        """
+        Keep the TLS session of the current connection for the next one
+        """
+        protocol = self.protocol
+        if protocol is not None and protocol.transport is not None:
+            ssl_object = protocol.transport.get_extra_info('ssl_object')
+            session = getattr(ssl_object, 'session', None)
+            if session is not None:
+                self.ssl_sessions[protocol.server] = session
+
+    def get_server(self):
+        """
+        Return the (host, port) to connect to
+        @rtype: tuple
+        """
+        return self.backoff.server
+
+    def reconnect(self, failed=False):
+        """
+        Close the current connection and open a new one after the backoff
+        delay
+        @type   failed: bool
+        """
+        if self.closing:
+            return
+        self.lag.stop()
+        self.save_ssl_session()
+        if self.protocol is not None:
+            self.protocol.close()
+        self.backoff.disconnected(failed=failed)
+        delay = self.backoff.get_delay()
+        self.log.info('Reconnecting to %s:%s in %.1fs',
+                      *(self.backoff.server + (delay,)))
+        self.loop.call_later(delay, self.create_connection)
 
     def send_line(self, data):
         """
@@ -210,12 +643,37 @@ class Irc(base.IrcObject):
         """
         self.send(data.replace('\n', ' ').replace('\r', ' '))
 
-    def send(self, data):
+    def send(self, data, flush=False):
+        """
+        Send RAW data to the server through the flood control scheduler
+        @param  data:   str
+        @param  flush:  bool
+        """
+        if pool.in_worker():
+            # called by an offloaded callback in a worker thread
+            self.loop.call_soon_threadsafe(self.scheduler.push, data, flush)
+        else:
+            self.scheduler.push(data, flush)
+
+    def write(self, data, flush=False):
         """
-        Send RAW data to the server
+        Write RAW data to the protocol. Lines are written at the next loop
+        iteration unless flush is True
         @param  data:   str
+        @param  flush:  bool
         """
+        if pool.in_worker():
+            self.loop.call_soon_threadsafe(self.write, data, flush)
+            return
         self.protocol.write(data)
+        if flush:
+            self.protocol.flush()
+        if isinstance(data, bytes):
+            registry = self.registry
+            if not (registry.events_re['out'] or registry.numerics['out'] or
+                    registry.commands['out']):
+                return
+            data = data.decode(self.encoding, 'ignore')
         self.dispatch(data, iotype='out')
 
     # def _send(self, data):
@@ -229,13 +687,13 @@ class Irc(base.IrcObject):
         @type   message:    str
         """
         if message:
-            messages = utils.split_message(message, self.config.max_length)
             if isinstance(target, DCCChat):
+                messages = utils.split_message(
+                    message, self.config.max_length, self.encoding)
                 for message in messages:
                     target.send_line(message)
             elif target:
-                for message in messages:
-                    self.send_line(u'PRIVMSG {0:s} :{1:s}'.format(target, message))
+                self.send_text('PRIVMSG', target, message)
 
     def notice(self, target, message):
         """
@@ -244,13 +702,95 @@ class Irc(base.IrcObject):
         @type   message:    str
         """
         if message:
-            messages = utils.split_message(message, self.config.max_length)
             if isinstance(target, DCCChat):
+                messages = utils.split_message(
+                    message, self.config.max_length, self.encoding)
                 for message in messages:
                     target.action(message)
             elif target:
-                for message in messages:
-                    self.send_line(u'NOTICE {0:s} :{1:s}'.format(target, message))
+                self.send_text('NOTICE', target, message)
+
+    def send_text(self, command, target, message, ctcp=False):
+        """
+        Send a text split in as many lines as needed. Lines are built as
+        bytes from a head encoded once
+        @type   command:    str
+        @type   target:     str
+        @type   message:    str
+        @type   ctcp:       bool
+        """
+        encoding = self.encoding
+        max_length = self.get_max_length(command, target)
+        head = b''.join((command.encode(encoding), b' ',
+                         target.encode(encoding), b' :'))
+        tail = b''
+        if ctcp:
+            # 2 bytes for the \x01 delimiters
+            max_length -= 2
+            head += b'\x01'
+            tail = b'\x01'
+        build_line = utils.build_line
+        send = self.send
+        for message in utils.split_message(message, max_length, encoding):
+            send(build_line(head, message, tail, encoding))
+
+    def privmsg_many(self, targets, message):
+        """
+        Send a PRIVMSG to many targets with as few lines as allowed
+        @type   targets:    list
+        @type   message:    str
+        """
+        self.send_many('PRIVMSG', targets, message)
+
+    def notice_many(self, targets, message):
+        """
+        Send a NOTICE to many targets with as few lines as allowed
+        @type   targets:    list
+        @type   message:    str
+        """
+        self.send_many('NOTICE', targets, message)
+
+    def send_many(self, command, targets, message):
+        """
+        Send a message to comma separated targets. Each line has at most
+        the TARGMAX targets of the command and fit in 512 bytes. The body
+        is encoded once
+        @type   command:    str
+        @type   targets:    list
+        @type   message:    str
+        """
+        if not message:
+            return
+        encoding = self.encoding
+        limit = self.get_max_targets(command)
+        encoded = []
+        for target in targets:
+            if isinstance(target, DCCChat):
+                getattr(self, command.lower())(target, message)
+            elif target:
+                encoded.append(target.encode(encoding))
+        if not encoded:
+            return
+        head = command.encode(encoding) + b' '
+        send = self.send
+        # the server relays the body to each target separately
+        max_length = self.get_max_length(
+            command, max(encoded, key=len).decode(encoding))
+        for message in utils.split_message(message, max_length, encoding):
+            body = utils.build_line(b' :', message, encoding=encoding)
+            # 512 bytes minus the command, the body and the CRLF
+            size = 510 - len(head) - len(body)
+            line = []
+            length = 0
+            for target in encoded:
+                if line and (len(line) == limit or
+                             length + len(target) > size):
+                    send(head + b','.join(line) + body)
+                    line = []
+                    length = 0
+                line.append(target)
+                length += len(target) + 1
+            send(head + b','.join(line) + body)
 
     def ctcp(self, target, message):
         """
@@ -259,9 +799,7 @@ class Irc(base.IrcObject):
         @type   message:    str
         """
         if target and message:
-            messages = utils.split_message(message, self.config.max_length)
-            for message in messages:
-                self.send_line(u'PRIVMSG {0:s} :\x01{1:s}\x01'.format(target, message))
+            self.send_text('PRIVMSG', target, message, ctcp=True)
 
     def ctcp_reply(self, target, message):
         """
@@ -270,9 +808,7 @@ class Irc(base.IrcObject):
         @type   message:    str
         """
         if target and message:
-            messages = utils.split_message(message, self.config.max_length)
-            for message in messages:
-                self.send_line(u'NOTICE {0:s} :\x01{1:s}\x01'.format(target, message))
+            self.send_text('NOTICE', target, message, ctcp=True)
 
     def mode(self, target, *data):
         """
@@ -451,8 +987,60 @@ class Irc(base.IrcObject):
         self.reload()
 
     def SIGINT(self):
-        self.notify('SIGINT')
-        if getattr(self, 'protocol', None):
-            self.quit('INT')
-            time.sleep(1)
-        self.loop.stop()
+        if self.closing:
+            # second SIGINT. don't wait
+            self.loop.stop()
+            return
+        bots = [bot for bot in self.instances if bot.loop is self.loop]
+        for bot in bots:
+            bot.notify('SIGINT')
+        shutdown = asyncio.gather(*[bot.shutdown('INT') for bot in bots])
+        shutdown.add_done_callback(lambda f: self.loop.stop())
+
+    @asyncio.coroutine
+    def shutdown(self, reason='Quitting', timeout=None):
+        """
+        Stop handling incoming lines, send the waiting outbound lines, quit,
+        close DCC connections and stop the executors of offloaded callbacks.
+        Waits at most timeout seconds (shutdown_timeout by default)
+        @type   reason:     str
+        @type   timeout:    float
+        """
+        if timeout is None:
+            timeout = self.config.shutdown_timeout
+        loop = self.loop
+        deadline = loop.time() + timeout
+        self.closing = True
+        self.lag.stop()
+        protocol = self.protocol
+        if protocol is not None and not protocol.closed:
+            try:
+                yield from asyncio.wait_for(
+                    self.scheduler.drain(),
+                    max(0., deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.log.warning('Dropping %d outbound lines',
+                                 self.scheduler.queued)
+            self.scheduler.reset()
+            self.write(utils.build_line(b'QUIT :', reason,
+                                        encoding=self.encoding),
+                       flush=True)
+            try:
+                yield from asyncio.wait_for(
+                    asyncio.shield(protocol.lost),
+                    max(0., deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.log.warning('Server did not close the connection')
+            protocol.close()
+        if self._dcc is not None:
+            closed = self._dcc.close()
+            if closed:
+                yield from asyncio.wait(
+                    closed, timeout=max(0., deadline - loop.time()))
+        running = self.executors.shutdown(wait=False)
+        if running:
+            done, running = yield from asyncio.wait(
+                running, timeout=max(0., deadline - loop.time()))
+            if running:
+                self.log.warning('%d offloaded callbacks still running',
+                                 len(running))
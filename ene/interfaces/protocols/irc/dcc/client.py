@@ -1,15 +1,16 @@
 from __future__ import unicode_literals
 import struct
-from collections import deque
 from functools import partial
 import asyncio
 from asyncio.queues import Queue, QueueFull
+from ..utils import LineFramer
 
 
 class DCCBase(asyncio.Protocol):
 
     idle_handle = None
     idle_timeout = None
+    transport = None
     fd = None
 
     def __init__(self, **kwargs):
@@ -73,7 +74,8 @@ class DCCChat(DCCBase):
         super(DCCChat, self).connection_made(transport)
         self.encoding = getattr(self.bot, 'encoding', 'ascii')
         self.set_timeout()
-        self.queue = deque()
+        self.framer = LineFramer(
+            self.encoding, self.bot.config.get('max_line_length', 0))
 
     def decode(self, data):
         """Decode data with bot's encoding"""
@@ -82,12 +84,7 @@ class DCCChat(DCCBase):
     def data_received(self, data):
         """data received"""
         self.set_timeout()
-        data = self.decode(data)
-        if self.queue:
-            data = self.queue.popleft() + data
-        lines = data.replace('\r', '').split('\n')
-        self.queue.append(lines.pop(-1))
-        for line in lines:
+        for line in self.framer.feed(data):
             self.bot.dispatch(line, iotype='dcc_in', client=self)
 
     def encode(self, data):
@@ -204,6 +201,8 @@ class DCCSend(DCCBase):
                 self.transport.close()
 
     def close(self, *args, **kwargs):
+        if self.transport is not None:
+            self.loop.remove_writer(self.socket)
         if self.fd:
             self.fd.close()
             self.fd = None
@@ -111,6 +111,16 @@ class DCCManager(object):
             task.add_done_callback(partial(self.created, f))
         return f
 
+    def close(self):
+        """Close all connections. Return their closed futures"""
+        closed = []
+        for info in self.connections.values():
+            for protocols in list(info['masks'].values()):
+                for protocol in list(protocols.values()):
+                    protocol.close()
+                    closed.append(protocol.closed)
+        return closed
+
     def resume(self, mask, filename, port, pos):
         """Resume a DCC send"""
         self.connections['send']['masks'][mask][port].offset = pos
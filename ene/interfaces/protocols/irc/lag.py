@@ -0,0 +1,101 @@
+"""Connection health checks"""
+from collections import deque
+from . import utils
+
+
+class LagMonitor:
+    """Send a PING every ``interval`` seconds and measure the time taken by
+    the server to answer. The bot reconnects when a PONG takes more than
+    ``max_lag`` seconds or when nothing is received for ``timeout``
+    seconds"""
+
+    def __init__(self, context, interval=60, max_lag=60, timeout=320,
+                 history=100):
+        self.context = context
+        self.interval = interval
+        self.max_lag = max_lag
+        self.timeout = timeout
+        self.history = deque(maxlen=history)
+        self.handle = None
+        self.pending = None
+        self.pings = 0
+        self.last_lag = None
+        self.last_received = None
+
+    @property
+    def lag(self):
+        """current lag. The time waited for the pending PONG if longer"""
+        if self.pending is not None:
+            waited = self.context.loop.time() - self.pending[1]
+            if self.last_lag is None or waited > self.last_lag:
+                return waited
+        return self.last_lag
+
+    def start(self):
+        self.pending = None
+        self.last_lag = None
+        self.received()
+        self.schedule(self.interval)
+
+    def stop(self):
+        self.pending = None
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def schedule(self, delay):
+        if self.handle is not None:
+            self.handle.cancel()
+        self.handle = self.context.loop.call_later(delay, self.tick)
+
+    def received(self):
+        """must be called each time data is received"""
+        self.last_received = self.context.loop.time()
+
+    def tick(self):
+        self.handle = None
+        context = self.context
+        now = context.loop.time()
+        if self.pending is not None and now - self.pending[1] >= self.max_lag:
+            context.log.warning('No PONG since %.1fs. Reconnecting',
+                                now - self.pending[1])
+            self.stop()
+            context.reconnect()
+        elif now - self.last_received >= self.timeout:
+            context.log.warning('Nothing received since %.1fs. Reconnecting',
+                                now - self.last_received)
+            self.stop()
+            context.reconnect()
+        elif self.pending is None:
+            self.pings += 1
+            token = 'LAG%d' % self.pings
+            self.pending = (token, now)
+            context.send(utils.build_line(b'PING :', token,
+                                          encoding=context.encoding),
+                         flush=True)
+            self.schedule(self.max_lag)
+        else:
+            self.schedule(max(0., self.pending[1] + self.max_lag - now))
+
+    def pong_received(self, message):
+        """PONG subscriber"""
+        token = message.trailing
+        if token is None and message.params:
+            token = message.params[-1]
+        if self.pending is not None and token == self.pending[0]:
+            lag = self.context.loop.time() - self.pending[1]
+            self.pending = None
+            self.last_lag = lag
+            self.history.append(lag)
+            self.schedule(self.interval)
+
+    def stats(self):
+        """return current and historic lag"""
+        history = list(self.history)
+        return dict(
+            lag=self.lag,
+            pings=self.pings,
+            average=sum(history) / len(history) if history else None,
+            max=max(history) if history else None,
+            history=history,
+        )
@@ -0,0 +1,328 @@
+"""Engines used by the Registry to find the events_re matching a line"""
+import re
+import sys
+import zlib
+from collections import defaultdict
+from operator import itemgetter
+from . import utils
+from . import _rfc
+
+PY35 = bool(sys.version_info[0:2] >= (3, 5))
+
+NAMED_GROUP = re.compile(r'\(\?P([<=])(\w+)')
+UNSUPPORTED = re.compile(r'\\[1-9]|\(\?\(|\(\?[aiLmsux]')
+
+
+class CommandIndex:
+    """Group events_re by the commands they can match. Patterns where
+    the command can't be guessed are candidates for all commands"""
+
+    def __init__(self):
+        self.dirty = True
+        self.commands = {}
+        self.wildcards = []
+
+    def build(self, events_re):
+        commands = {}
+        wildcards = []
+        for item in events_re:
+            keys = utils.get_commands(item[0])
+            if keys is None:
+                wildcards.append(item)
+                for candidates in commands.values():
+                    candidates.append(item)
+            else:
+                for key in keys:
+                    if key not in commands:
+                        commands[key] = list(wildcards)
+                    commands[key].append(item)
+        self.commands = commands
+        self.wildcards = wildcards
+        self.dirty = False
+
+    def get_candidates(self, data):
+        """Return the (regexp, cregexp) which may match data. Order is the
+        same as in events_re"""
+        return self.commands.get(utils.get_command(data), self.wildcards)
+
+    def get_matches(self, data):
+        for regexp, cregexp in self.get_candidates(data):
+            match = cregexp(data)
+            if match is not None:
+                yield regexp, match
+
+    def stats(self):
+        """return the number of hits per regexp when recorded"""
+        return {}
+
+
+class AdaptiveIndex(CommandIndex):
+    """Count hits per pattern and periodically sort the candidates so the
+    hottest patterns are tried first. Matches are still yielded in
+    events_re order so handlers fire in their registration order"""
+
+    # sort candidates every n lines
+    reorder_every = 1000
+
+    def __init__(self):
+        super(AdaptiveIndex, self).__init__()
+        self.hits = defaultdict(int)
+        self.positions = {}
+        self.lines = 0
+
+    def build(self, events_re):
+        super(AdaptiveIndex, self).build(events_re)
+        self.positions = {item[0]: i for i, item in enumerate(events_re)}
+        self.reorder()
+
+    def reorder(self):
+        hits = self.hits
+        positions = self.positions
+
+        def key(item):
+            return -hits.get(item[0], 0), positions[item[0]]
+
+        self.commands = {command: sorted(candidates, key=key)
+                         for command, candidates in self.commands.items()}
+        self.wildcards = sorted(self.wildcards, key=key)
+
+    def get_matches(self, data):
+        self.lines += 1
+        if self.lines % self.reorder_every == 0:
+            self.reorder()
+        positions = self.positions
+        matches = []
+        for regexp, cregexp in self.get_candidates(data):
+            match = cregexp(data)
+            if match is not None:
+                matches.append((positions[regexp], regexp, match))
+        if len(matches) > 1:
+            matches.sort(key=itemgetter(0))
+        hits = self.hits
+        for position, regexp, match in matches:
+            hits[regexp] += 1
+            yield regexp, match
+
+    def stats(self):
+        return dict(self.hits)
+
+
+class CombinedMatch:
+    """Match like object for one pattern of a combined regexp"""
+
+    __slots__ = ('match', 'names')
+
+    def __init__(self, match, names):
+        self.match = match
+        self.names = names
+
+    def group(self, name):
+        return self.match.group(self.names[name])
+
+    def groupdict(self):
+        group = self.match.group
+        return {name: group(outer) for name, outer in self.names.items()}
+
+
+class CombinedMatcher(CommandIndex):
+    """Compile the candidates of each command in a few large regexps. Each
+    pattern is wrapped in an optional lookahead so one match tells which
+    patterns matched.
+
+    Candidates are split in chunks using their content so attaching or
+    detaching an event only recompile the chunks it belongs to. Patterns
+    which can't be combined (custom matchers, flags, numbered
+    backreferences) are matched alone"""
+
+    # average number of patterns per chunk
+    chunk_size = 32
+    # python < 3.5 do not support more than 100 groups
+    max_groups = 1000 if PY35 else 99
+
+    def __init__(self):
+        super(CombinedMatcher, self).__init__()
+        self.cache = {}
+
+    def get_pattern(self, cregexp):
+        """return the pattern used by cregexp if it can be combined"""
+        compiled = getattr(cregexp, '__self__', None)
+        if getattr(cregexp, '__name__', None) != 'match':
+            return None
+        pattern = getattr(compiled, 'pattern', None)
+        if not isinstance(pattern, str):
+            return None
+        if compiled.flags & ~re.UNICODE or UNSUPPORTED.search(pattern):
+            return None
+        return pattern
+
+    def compile(self, chunk):
+        """return a segment for a list of (regexp, pattern)"""
+        parts = []
+        entries = []
+        for i, (regexp, pattern) in enumerate(chunk):
+            outer = '_%d' % i
+            prefix = outer + '_'
+            names = {name: prefix + name
+                     for name in re.compile(pattern).groupindex}
+            pattern = NAMED_GROUP.sub(r'(?P\1%s\2' % prefix, pattern)
+            parts.append('(?:(?=(?P<%s>%s))|)' % (outer, pattern))
+            entries.append((regexp, outer, names))
+        return re.compile(''.join(parts)).match, None, entries
+
+    def get_segments(self, candidates, cache):
+        """return the segments matching the same patterns as candidates"""
+        segments = []
+        chunk = []
+        groups = 0
+
+        def flush():
+            if chunk:
+                key = tuple(chunk)
+                segment = cache.get(key) or self.cache.get(key)
+                if segment is None:
+                    segment = self.compile(key)
+                cache[key] = segment
+                segments.append(segment)
+                del chunk[:]
+
+        for regexp, cregexp in candidates:
+            pattern = self.get_pattern(cregexp)
+            if pattern is None:
+                flush()
+                groups = 0
+                segments.append((cregexp, regexp, None))
+                continue
+            size = cregexp.__self__.groups + 1
+            if chunk and groups + size > self.max_groups:
+                flush()
+                groups = 0
+            chunk.append((regexp, pattern))
+            groups += size
+            if zlib.crc32(pattern.encode('utf8')) % self.chunk_size == 0:
+                flush()
+                groups = 0
+        flush()
+        return segments
+
+    def build(self, events_re):
+        super(CombinedMatcher, self).build(events_re)
+        cache = {}
+        self.commands = {
+            command: self.get_segments(candidates, cache)
+            for command, candidates in self.commands.items()}
+        self.wildcards = self.get_segments(self.wildcards, cache)
+        self.cache = cache
+
+    def get_matches(self, data):
+        for cregexp, regexp, entries in self.get_candidates(data):
+            match = cregexp(data)
+            if match is None:
+                continue
+            if entries is None:
+                yield regexp, match
+            else:
+                group = match.group
+                for regexp, outer, names in entries:
+                    if group(outer) is not None:
+                        yield regexp, CombinedMatch(match, names)
+
+
+FIELD = re.compile(r'\(\?P<(\w+)>\\S\+\)$')
+TRAILING = re.compile(r':\(\?P<(\w+)>\.\*\)$')
+LITERAL = re.compile(r'\w+$')
+
+
+class NumericSplitter:
+    """Match the line of a :class:`~_rfc.retcode` without its regexp. The
+    line is split on spaces and the params are mapped to the names listed
+    in ``.params``. Raise ValueError if the regexp uses more than named
+    ``\\S+`` params, a trailing ``.*`` param, words and ``.``:
+    .. code-block:: py
+        >>> split = NumericSplitter(_rfc.RPL_TOPIC)
+        >>> match = split(':srv 332 nick #chan :the topic')
+        >>> print(match['channel'], match['data'])
+        #chan the topic
+    """
+
+    __slots__ = ('re', 'names', 'getter', 'literals', 'prefix', 'trailing',
+                 'length', 'maxsplit', 'required')
+
+    def __init__(self, retcode):
+        self.re = retcode.re
+        words = retcode.re.lstrip('^').split(' ')
+        last = len(words) - 1
+        names = []
+        indices = []
+        # (index, word). None is any char
+        literals = []
+        self.prefix = self.trailing = False
+        for i, word in enumerate(words):
+            if i == 0 and word[:1] == ':' and FIELD.match(word[1:]):
+                self.prefix = True
+                name = FIELD.match(word[1:]).group(1)
+            elif FIELD.match(word):
+                name = FIELD.match(word).group(1)
+            elif i == last and TRAILING.match(word):
+                self.trailing = True
+                name = TRAILING.match(word).group(1)
+            elif LITERAL.match(word) or word == '.':
+                literals.append((i, word if word != '.' else None))
+                continue
+            else:
+                raise ValueError('Can not split %r' % retcode.re)
+            names.append(name)
+            indices.append(i)
+        if not names or names != list(getattr(retcode, 'params', ())):
+            raise ValueError('%r do not match its params' % retcode.re)
+        self.names = names
+        self.literals = literals
+        if len(indices) == 1:
+            index = indices[0]
+            self.getter = lambda parts: (parts[index],)
+        else:
+            self.getter = itemgetter(*indices)
+        self.length = len(words)
+        # a trailing param gets the remaining of the line and may be empty
+        self.maxsplit = self.length - 1 if self.trailing else self.length
+        self.required = self.maxsplit if self.trailing else self.length
+
+    def __call__(self, data):
+        """return the params as a dict or None"""
+        parts = data.split(' ', self.maxsplit)
+        if len(parts) < self.length or '' in parts[:self.required]:
+            return None
+        for i, word in self.literals:
+            if parts[i] != word and (word is not None or len(parts[i]) != 1):
+                return None
+        if self.prefix:
+            if parts[0][:1] != ':' or len(parts[0]) < 2:
+                return None
+            parts[0] = parts[0][1:]
+        if self.trailing:
+            i = self.length - 1
+            if parts[i][:1] != ':':
+                return None
+            parts[i] = parts[i][1:]
+        return dict(zip(self.names, map(utils.IrcString, self.getter(parts))))
+
+
+def build_numerics(retcodes):
+    """return a numeric -> :class:`NumericSplitter` dict. Retcodes which
+    can't be split are not included"""
+    numerics = {}
+    for numeric, retcode in retcodes.items():
+        try:
+            numerics[int(numeric)] = NumericSplitter(retcode)
+        except ValueError:
+            pass
+    return numerics
+
+
+NUMERICS = build_numerics(_rfc.RETCODES)
+
+
+ENGINES = {
+    'index': CommandIndex,
+    'adaptive': AdaptiveIndex,
+    'combined': CombinedMatcher,
+}
@@ -0,0 +1,110 @@
+from datetime import datetime
+from datetime import timezone
+from .utils import IrcString
+
+TAG_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+
+def unescape_tag(value):
+    """unescape a message tag value:
+    .. code-block:: py
+        >>> print(unescape_tag(r'a\\sb\\:c'))
+        a b;c
+    """
+    if '\\' not in value:
+        return value
+    chars = []
+    escaped = False
+    for char in value:
+        if escaped:
+            chars.append(TAG_ESCAPES.get(char, char))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        else:
+            chars.append(char)
+    return ''.join(chars)
+
+
+def parse_tags(data):
+    """parse IRCv3 message tags:
+    .. code-block:: py
+        >>> sorted(parse_tags('time=2011-10-19T16:40:51.620Z;+draft').items())
+        [('+draft', None), ('time', '2011-10-19T16:40:51.620Z')]
+    """
+    tags = {}
+    for tag in data.split(';'):
+        key, sep, value = tag.partition('=')
+        tags[key] = unescape_tag(value) if sep else None
+    return tags
+
+
+class Message:
+    """A parsed irc line:
+    .. code-block:: py
+        >>> m = Message.parse(':nick!user@host PRIVMSG #chan :hello world')
+        >>> print(m.prefix.nick, m.command, m.params, m.trailing)
+        nick PRIVMSG ['#chan'] hello world
+    """
+
+    __slots__ = ('tags', 'prefix', 'command', 'params', 'trailing')
+
+    def __init__(self, command, params=None, trailing=None,
+                 prefix=None, tags=None):
+        self.tags = tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params if params is not None else []
+        self.trailing = trailing
+
+    @classmethod
+    def parse(cls, data):
+        """Tokenize a raw line"""
+        tags = prefix = None
+        if data[:1] == '@':
+            tags, _, data = data[1:].partition(' ')
+            tags = parse_tags(tags)
+            data = data.lstrip(' ')
+        if data[:1] == ':':
+            prefix, _, data = data[1:].partition(' ')
+            prefix = IrcString(prefix)
+            data = data.lstrip(' ')
+        if data[:1] == ':':
+            data, trailing = '', data[1:]
+        else:
+            data, sep, trailing = data.partition(' :')
+            if not sep:
+                trailing = None
+        params = data.split()
+        command = params.pop(0).upper() if params else ''
+        return cls(command, params, trailing, prefix, tags)
+
+    @property
+    def time(self):
+        """server-time tag as an UTC datetime. None if missing:
+        .. code-block:: py
+            >>> m = Message.parse('@time=2011-10-19T16:40:51.620Z PING :a')
+            >>> print(m.time)
+            2011-10-19 16:40:51.620000+00:00
+        """
+        value = self.tags and self.tags.get('time')
+        if not value:
+            return None
+        value = value.rstrip('Z')
+        fmt = '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S'
+        try:
+            time = datetime.strptime(value, fmt)
+        except ValueError:
+            return None
+        return time.replace(tzinfo=timezone.utc)
+
+    @property
+    def args(self):
+        """params including the trailing one"""
+        if self.trailing is None:
+            return self.params
+        return self.params + [self.trailing]
+
+    def __repr__(self):
+        return '<Message %s %r %r>' % (self.command, self.params,
+                                       self.trailing)
@@ -0,0 +1,320 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'coalesce')
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+# active is True while an offloaded callback runs in the current thread
+local = threading.local()
+
+
+def get_name(callback):
+    return getattr(callback, '__qualname__', None) or repr(callback)
+
+
+def in_worker():
+    """return True when called by an offloaded callback. The loop must then
+    be reached with ``call_soon_threadsafe``"""
+    return getattr(local, 'active', False)
+
+
+def timed_call(callback, kwargs):
+    """Run in a worker. return (duration, result, exception)"""
+    local.active = True
+    start = time.perf_counter()
+    try:
+        result = callback(**kwargs)
+    except Exception as e:
+        return time.perf_counter() - start, None, e
+    finally:
+        local.active = False
+    return time.perf_counter() - start, result, None
+
+
+class EventQueue:
+    """Pending calls of a coroutine event"""
+
+    def __init__(self, e, max_tasks, max_queue, overflow):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Invalid overflow policy %r' % overflow)
+        self.event = e
+        self.max_tasks = max_tasks
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.queue = deque()
+        # mask -> last queued entry. used by the coalesce policy
+        self.masks = {}
+        self.running = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @property
+    def name(self):
+        return get_name(self.event.callback)
+
+    @property
+    def full(self):
+        return self.max_tasks and self.running >= self.max_tasks
+
+    def put(self, match):
+        """queue a call. return False if the call has been dropped"""
+        if self.max_queue and len(self.queue) >= self.max_queue:
+            if self.overflow == 'drop_newest':
+                self.dropped += 1
+                return False
+            elif self.overflow == 'coalesce':
+                entry = self.masks.get(match.get('mask'))
+                if entry is None:
+                    self.dropped += 1
+                    return False
+                entry[0] = match
+                self.coalesced += 1
+                return True
+            else:
+                self.get()
+                self.dropped += 1
+        entry = [match]
+        self.queue.append(entry)
+        mask = match.get('mask')
+        if mask is not None:
+            self.masks[mask] = entry
+        return True
+
+    def get(self):
+        entry = self.queue.popleft()
+        mask = entry[0].get('mask')
+        if self.masks.get(mask) is entry:
+            del self.masks[mask]
+        return entry[0]
+
+
+class TaskPool:
+    """Run coroutine events with a bounded concurrency. Calls which can't be
+    started are queued per event and dropped or coalesced according to the
+    overflow policy when the queue is full"""
+
+    def __init__(self, context, max_tasks=0, max_event_tasks=0,
+                 max_queue=1000, overflow='drop_oldest'):
+        self.context = context
+        self.max_tasks = max_tasks
+        self.max_event_tasks = max_event_tasks
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.queues = {}
+        # queues with pending calls waiting for a global slot
+        self.ready = deque()
+        self.running = 0
+
+    @property
+    def full(self):
+        return self.max_tasks and self.running >= self.max_tasks
+
+    def get_queue(self, e):
+        queue = self.queues.get(e)
+        if queue is None:
+            queue = self.queues[e] = EventQueue(
+                e,
+                getattr(e, 'max_tasks', self.max_event_tasks),
+                getattr(e, 'max_queue', self.max_queue),
+                getattr(e, 'overflow', self.overflow))
+        return queue
+
+    def submit(self, e, match):
+        """run ``e.callback(**match)`` now or queue it"""
+        queue = self.get_queue(e)
+        if queue.queue or queue.full or self.full:
+            if queue.put(match) and queue not in self.ready:
+                self.ready.append(queue)
+        else:
+            self.start(queue, match)
+
+    def start(self, queue, match):
+        try:
+            coro = queue.event.callback(**match)
+        except Exception:
+            # e.g. a TypeError on unexpected arguments. no slot is taken
+            self.context.log.error('%s failed', queue.name, exc_info=True)
+            return
+        self.running += 1
+        queue.running += 1
+        task = self.context.create_task(coro)
+        task.add_done_callback(partial(self.done, queue))
+
+    def done(self, queue, task):
+        self.running -= 1
+        queue.running -= 1
+        if not task.cancelled():
+            exc = task.exception()
+            if exc is not None:
+                self.context.log.error(
+                    '%s failed', queue.name,
+                    exc_info=(exc.__class__, exc, exc.__traceback__))
+        self.wakeup()
+
+    def wakeup(self):
+        """start queued calls while slots are available. queues are served
+        in round robin"""
+        ready = self.ready
+        # number of queues skipped in a row because their event is full
+        idle = 0
+        while ready and idle < len(ready) and not self.full:
+            queue = ready.popleft()
+            if queue.full:
+                idle += 1
+            else:
+                idle = 0
+                self.start(queue, queue.get())
+            if queue.queue:
+                ready.append(queue)
+
+    def stats(self):
+        """return queue depths and drop counters"""
+        events = {}
+        for queue in self.queues.values():
+            events[queue.name] = dict(
+                running=queue.running,
+                queued=len(queue.queue),
+                dropped=queue.dropped,
+                coalesced=queue.coalesced,
+            )
+        return dict(
+            running=self.running,
+            queued=sum(len(q.queue) for q in self.queues.values()),
+            dropped=sum(q.dropped for q in self.queues.values()),
+            events=events,
+        )
+
+
+class ExecutorPool:
+    """Run blocking callbacks in a thread or process pool. Results and
+    exceptions are routed back to the loop and execution times are
+    recorded per callback. Process pools can only run module level
+    functions: bound methods and closures can't be pickled"""
+
+    def __init__(self, context, default='thread', max_workers=4):
+        self.context = context
+        self.default = default
+        self.max_workers = max_workers
+        self.executors = {}
+        # loop future -> executor future of the calls not done yet
+        self.pending = {}
+        # name -> dict(calls, total, max)
+        self.timings = {}
+
+    def get_executor(self, kind=True):
+        """return an executor. kind can be ``thread``, ``process``, an
+        ``Executor`` instance or True for the default one"""
+        if isinstance(kind, Executor):
+            return kind
+        if kind is True:
+            kind = self.default
+        executor = self.executors.get(kind)
+        if executor is None:
+            executor = self.executors[kind] = EXECUTORS[kind](
+                max_workers=self.max_workers)
+        return executor
+
+    def check(self, callback, executor=True):
+        """raise ValueError if callback can't be run by executor"""
+        if executor is True:
+            executor = self.default
+        if executor == 'process' or isinstance(executor,
+                                               ProcessPoolExecutor):
+            name = get_name(callback)
+            if getattr(callback, '__self__', None) is not None or '<' in name:
+                raise ValueError(
+                    '%s can not be pickled. Process executors only run '
+                    'module level functions' % name)
+
+    def run(self, callback, kwargs, executor=True):
+        """run ``callback(**kwargs)`` in an executor. return a future"""
+        loop = self.context.loop
+        call = self.get_executor(executor).submit(
+            timed_call, callback, dict(kwargs))
+        future = asyncio.wrap_future(call, loop=loop)
+        self.pending[future] = call
+        result = asyncio.Future(loop=loop)
+        future.add_done_callback(
+            partial(self.done, get_name(callback), result))
+        return result
+
+    def submit(self, e, match):
+        """run an event offloaded with its ``executor`` attribute. The result
+        is passed to ``e.on_result`` in the loop when the event has one.
+        Else a returned line (or list of lines) is sent to the server"""
+        result = self.run(e.callback, match, e.executor)
+        result.add_done_callback(partial(self.deliver, e))
+
+    def deliver(self, e, result):
+        if result.cancelled():
+            return
+        if result.exception() is not None:
+            self.log_error(result)
+            return
+        value = result.result()
+        on_result = getattr(e, 'on_result', None)
+        if on_result is not None:
+            self.context.call_callback(on_result, value)
+        elif isinstance(value, (str, bytes)):
+            self.context.send(value)
+        elif isinstance(value, (list, tuple)):
+            for line in value:
+                self.context.send(line)
+
+    def done(self, name, result, future):
+        self.pending.pop(future, None)
+        if future.cancelled():
+            result.cancel()
+            return
+        exc = future.exception()
+        if exc is None:
+            duration, value, exc = future.result()
+            self.record(name, duration)
+        if result.cancelled():
+            return
+        if exc is None:
+            result.set_result(value)
+        else:
+            result.set_exception(exc)
+
+    def log_error(self, result):
+        if not result.cancelled():
+            exc = result.exception()
+            if exc is not None:
+                self.context.log.error(
+                    'Offloaded callback failed',
+                    exc_info=(exc.__class__, exc, exc.__traceback__))
+
+    def record(self, name, duration):
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = dict(calls=0, total=0., max=0.)
+        timing['calls'] += 1
+        timing['total'] += duration
+        if duration > timing['max']:
+            timing['max'] = duration
+
+    def stats(self):
+        """return execution times per callback"""
+        return {name: dict(timing) for name, timing in self.timings.items()}
+
+    def shutdown(self, wait=False):
+        """stop the executors. Calls not started yet are cancelled. return
+        the futures of the calls still running"""
+        running = [future for future, call in self.pending.items()
+                   if not call.cancel()]
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
+        self.executors = {}
+        return running
@@ -0,0 +1,156 @@
+"""Outbound flood control"""
+import asyncio
+from collections import deque
+
+# lower is sent first. other commands use DEFAULT_PRIORITY
+PRIORITIES = {
+    'PONG': 0,
+    'PING': 0,
+    'QUIT': 0,
+    'PRIVMSG': 2,
+    'NOTICE': 2,
+}
+DEFAULT_PRIORITY = 1
+LEVELS = 3
+
+
+def get_key(data):
+    """return (priority, target) of an outbound line:
+    .. code-block:: py
+        >>> get_key('PRIVMSG #chan :hello')
+        (2, '#chan')
+        >>> get_key(b'PONG :server')
+        (0, ':server')
+    """
+    if isinstance(data, bytes):
+        data = data.split(b' ', 2)
+        data = b' '.join(data[:2]).decode('utf8', 'ignore')
+    command, _, data = data.partition(' ')
+    target = data.split(' ', 1)[0]
+    return PRIORITIES.get(command.upper(), DEFAULT_PRIORITY), target
+
+
+class Scheduler:
+    """Send lines with a token bucket. ``burst`` lines can be sent at once
+    then ``rate`` lines per second. Waiting lines are sent by priority and
+    in round robin between their targets. A single timer is used to wait
+    for tokens. A rate of 0 disable flood control"""
+
+    def __init__(self, loop, send, burst=5, rate=1.):
+        self.loop = loop
+        self.send = send
+        self.burst = burst
+        self.rate = rate
+        self.handle = None
+        self.sent = 0
+        self.delayed = 0
+        self.max_queued = 0
+        # futures waiting for an empty queue
+        self.waiters = []
+        self.reset()
+
+    def reset(self):
+        """drop waiting lines and refill the bucket"""
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        self.tokens = float(self.burst)
+        self.updated = self.loop.time()
+        # per priority: target -> waiting (data, flush)
+        self.queues = [{} for i in range(LEVELS)]
+        # per priority: targets with waiting lines in round robin order
+        self.rings = [deque() for i in range(LEVELS)]
+        self.queued = 0
+        self.wakeup()
+
+    def take(self):
+        """consume a token. return False if none is available"""
+        if not self.rate:
+            return True
+        now = self.loop.time()
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = min(tokens, float(self.burst))
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def push(self, data, flush=False):
+        """send data now if possible or queue it"""
+        if not self.queued and self.take():
+            self.sent += 1
+            self.send(data, flush)
+            return
+        priority, target = get_key(data)
+        queues = self.queues[priority]
+        queue = queues.get(target)
+        if queue is None:
+            queue = queues[target] = deque()
+            self.rings[priority].append(target)
+        queue.append((data, flush))
+        self.queued += 1
+        self.delayed += 1
+        if self.queued > self.max_queued:
+            self.max_queued = self.queued
+        self.schedule()
+
+    def pop(self):
+        for queues, ring in zip(self.queues, self.rings):
+            if ring:
+                target = ring.popleft()
+                queue = queues[target]
+                item = queue.popleft()
+                if queue:
+                    ring.append(target)
+                else:
+                    del queues[target]
+                self.queued -= 1
+                return item
+
+    def schedule(self):
+        if self.handle is None:
+            delay = max(0., (1 - self.tokens) / self.rate)
+            self.handle = self.loop.call_later(delay, self.run)
+
+    def run(self):
+        """send waiting lines while tokens are available"""
+        self.handle = None
+        while self.queued and self.take():
+            self.sent += 1
+            self.send(*self.pop())
+        if self.queued:
+            self.schedule()
+        else:
+            self.wakeup()
+
+    def drain(self):
+        """return a future done once no line is waiting"""
+        future = asyncio.Future(loop=self.loop)
+        if self.queued:
+            self.waiters.append(future)
+        else:
+            future.set_result(None)
+        return future
+
+    def wakeup(self):
+        waiters, self.waiters = self.waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    def stats(self):
+        """return queue depths and counters"""
+        targets = {}
+        for queues in self.queues:
+            for target, queue in queues.items():
+                targets[target] = targets.get(target, 0) + len(queue)
+        return dict(
+            queued=self.queued,
+            max_queued=self.max_queued,
+            sent=self.sent,
+            delayed=self.delayed,
+            priorities=[sum(len(q) for q in queues.values())
+                        for queues in self.queues],
+            targets=targets,
+        )
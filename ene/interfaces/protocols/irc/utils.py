@@ -7,6 +7,9 @@ import functools
 import logging
 import os
 import re
+import ssl
+from collections.abc import Mapping
+from string import Formatter
 
 
 def slugify(value):
@@ -91,24 +94,366 @@ class IrcString(str):
         return not (self.is_server or self.is_channel)
 
 
+class IrcMatch(Mapping):
+    r"""Lazy ``groupdict()`` of a match. Groups are wrapped in
+    :class:`IrcString` the first time they are accessed:
+    .. code-block:: py
+        >>> match = re.match('(?P<mask>\S+) (?P<data>.*)', 'a!b@c hi')
+        >>> match = IrcMatch(match)
+        >>> print(match['mask'].nick)
+        a
+        >>> sorted(match)
+        ['data', 'mask']
+    """
+
+    __slots__ = ('match', 'names', 'values')
+
+    def __init__(self, match):
+        self.match = match
+        names = getattr(match, 'names', None)
+        self.names = names if names is not None else match.re.groupindex
+        self.values = {}
+
+    def __getitem__(self, key):
+        values = self.values
+        if key in values:
+            return values[key]
+        if key not in self.names:
+            raise KeyError(key)
+        value = self.match.group(key)
+        if value is not None:
+            value = IrcString(value)
+        values[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+
+    def __iter__(self):
+        values = self.values
+        for key in self.names:
+            yield key
+        for key in values:
+            if key not in self.names:
+                yield key
+
+    def __len__(self):
+        return len(self.names) + len(
+            [key for key in self.values if key not in self.names])
+
+
+COMMAND = re.compile(r'(?::\S+ )?(\S+)').match
+
+COMMANDS_RE = re.compile(
+    r'\^?'
+    # an optional prefix. only atoms which can't match a space are allowed
+    r'(?::(?:\(\?P<\w+>|\\S[+*]?|[\w!@]|\))+ )?'
+    r'(?P<open>(?:\(\?P<\w+>|\((?:\?:)?)*)'
+    r'(?P<commands>[A-Za-z0-9]+(?:\|[A-Za-z0-9]+)*)'
+    r'(?P<close>\)*)'
+    r'(?P<tail>.*)\Z', re.DOTALL)
+
+QUANTIFIER = re.compile(r'[?*]|\{\d*(?:,\d*)?\}').match
+
+
+def get_command(data):
+    """return the command (or numeric) of a raw line:
+    .. code-block:: py
+        >>> print(get_command(':irc.freenode.net 001 nick :Welcome'))
+        001
+        >>> print(get_command('PING :irc.freenode.net'))
+        PING
+    """
+    match = COMMAND(data)
+    if match is not None:
+        return match.group(1)
+
+
+def _split_regexp(regexp, stop=None):
+    """split regexp on top level ``|``. stop at the first unbalanced ``)``.
+    return the alternatives and the remaining string"""
+    parts = []
+    depth = start = i = 0
+    length = len(regexp)
+    while i < length:
+        char = regexp[i]
+        if char == '\\':
+            i += 1
+        elif char == '[':
+            i += 1
+            if regexp[i:i + 1] == '^':
+                i += 1
+            if regexp[i:i + 1] == ']':
+                i += 1
+            while i < length and regexp[i] != ']':
+                if regexp[i] == '\\':
+                    i += 1
+                i += 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            if depth == 0 and stop:
+                break
+            depth -= 1
+        elif char == '|' and depth == 0:
+            parts.append(regexp[start:i])
+            start = i + 1
+        i += 1
+    parts.append(regexp[start:i])
+    return parts, regexp[i + 1:]
+
+
+def _is_terminated(tail):
+    """return True if tail can only match the end of a command. An empty
+    tail is not: events use a prefix match so ``PRIVMSG`` also matches
+    ``PRIVMSGX``"""
+    if not tail:
+        return False
+    if tail.startswith('$'):
+        return True
+    for sep in (' ', r'\s'):
+        if tail.startswith(sep):
+            return QUANTIFIER(tail, len(sep)) is None
+    if tail.startswith('('):
+        body = tail[1:]
+        if body.startswith('?:'):
+            body = body[2:]
+        elif body.startswith('?P<'):
+            body = body[body.index('>') + 1:]
+        elif body.startswith('?'):
+            return False
+        alternatives, rest = _split_regexp(body, stop=True)
+        if QUANTIFIER(rest) is not None:
+            return False
+        return all(_is_terminated(alt or rest) for alt in alternatives)
+    return False
+
+
+def get_commands(regexp):
+    r"""return the set of commands (or numerics) a regexp is able to match.
+    return None if this can't be guessed from the pattern:
+    .. code-block:: py
+        >>> sorted(get_commands(r'^:(?P<mask>\S+) (?P<event>JOIN|PART) '))
+        ['JOIN', 'PART']
+        >>> sorted(get_commands(r'^PING :?(?P<data>.*)'))
+        ['PING']
+        >>> get_commands(r'^:(?P<mask>\S+) (?P<event>\S+)') is None
+        True
+        >>> get_commands(r'^:(?P<srv>\S+) 00') is None
+        True
+    """
+    if re.search(r'\(\?[aiLmsux]', regexp):
+        return None
+    if len(_split_regexp(regexp)[0]) > 1:
+        return None
+    match = COMMANDS_RE.match(regexp)
+    if match is None:
+        return None
+    if match.group('open').count('(') != len(match.group('close')):
+        return None
+    if not _is_terminated(match.group('tail')):
+        return None
+    return frozenset(match.group('commands').split('|'))
+
+
+def template_keys(template):
+    r"""return the config keys interpolated in a regexp template. None if
+    the template can't be parsed:
+    .. code-block:: py
+        >>> template_keys(r'^:(?P<mask>\S+) INVITE {nick} :?(?P<channel>\S+)')
+        ('nick',)
+        >>> template_keys(r'^PING :?(?P<data>.*)')
+        ()
+    """
+    keys = set()
+    try:
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if field is not None:
+                keys.add(re.split(r'[.\[]', field, 1)[0])
+    except ValueError:
+        return None
+    return tuple(sorted(keys))
+
+
 STRIPPED_CHARS = '\t '
 
 
-def split_message(message, max_length):
-    """Split long messages"""
-    if len(message) >= max_length:
-        messages = message.split(' ')
-        message = ''
-        while messages:
-            buf = messages.pop(0)
-            if len(message) + len(buf) > max_length:
-                if message.strip(STRIPPED_CHARS):
-                    yield message.strip(STRIPPED_CHARS)
-                message = ''
-            message += ' ' + buf
-    message = message.strip(STRIPPED_CHARS)
-    if message:
-        yield message
+# color formatting codes
+FORMATTING_RE = re.compile(
+    r'\x03(?:\d{1,2}(?:,\d{1,2})?)?'
+    r'|\x04(?:[0-9a-fA-F]{6}(?:,[0-9a-fA-F]{6})?)?')
+
+
+def _split_word(word, max_length, encoding):
+    """Split a word longer than max_length bytes between chars. Formatting
+    codes are kept in one piece. A char longer than max_length is sent
+    alone"""
+    start = 0
+    while start < len(word):
+        end = start + max_length
+        size = len(word[start:end].encode(encoding))
+        while size > max_length and end > start + 1:
+            # chars use at most 4 bytes
+            end = max(end - (size - max_length + 3) // 4, start + 1)
+            size = len(word[start:end].encode(encoding))
+        if end < len(word):
+            # longest formatting code is 15 chars
+            for pos in (word.rfind('\x03', start + 1, end),
+                        word.rfind('\x04', start + 1, end)):
+                if pos > start and pos > end - 16:
+                    code = FORMATTING_RE.match(word, pos)
+                    if code.end() > end:
+                        end = pos
+            size = len(word[start:end].encode(encoding))
+        yield word[start:end], size
+        start = end
+
+
+def split_message(message, max_length, encoding='utf8'):
+    """Split long messages in chunks of at most max_length encoded bytes.
+    Messages are split on spaces when possible, never inside a multibyte
+    char or a formatting code:
+    .. code-block:: py
+        >>> list(split_message('aa bb cc', 5))
+        ['aa bb', 'cc']
+        >>> [len(m.encode()) for m in split_message('\\xe9' * 3, 4)]
+        [4, 2]
+        >>> list(split_message('\\x0312,01xxx', 7))
+        ['\\x0312,01x', 'xx']
+        >>> list(split_message('\\U0001F600\\U0001F600', 3)) == [
+        ...     '\\U0001F600', '\\U0001F600']
+        True
+        >>> list(split_message('hello world', 0))
+        Traceback (most recent call last):
+        ...
+        ValueError: max_length must be at least 1, got 0
+    """
+    if max_length < 1:
+        raise ValueError(
+            'max_length must be at least 1, got {0}'.format(max_length))
+    if len(message.encode(encoding)) <= max_length:
+        message = message.strip(STRIPPED_CHARS)
+        if message:
+            yield message
+        return
+    words = []
+    length = -1
+    for word in message.split(' '):
+        size = len(word.encode(encoding))
+        if length + 1 + size > max_length:
+            if words:
+                line = ' '.join(words).strip(STRIPPED_CHARS)
+                if line:
+                    yield line
+            words = []
+            length = -1
+            if size > max_length:
+                pieces = list(_split_word(word, max_length, encoding))
+                for piece, size in pieces[:-1]:
+                    yield piece
+                word, size = pieces[-1]
+        words.append(word)
+        length += 1 + size
+    line = ' '.join(words).strip(STRIPPED_CHARS)
+    if line:
+        yield line
+
+
+class SSLContext(ssl.SSLContext):
+    """SSLContext offering ``session`` to the servers so a previous TLS
+    session can be resumed"""
+
+    session = None
+
+    def wrap_socket(self, *args, **kwargs):
+        if self.session is not None:
+            kwargs.setdefault('session', self.session)
+        return super(SSLContext, self).wrap_socket(*args, **kwargs)
+
+    def wrap_bio(self, *args, **kwargs):
+        if self.session is not None:
+            kwargs.setdefault('session', self.session)
+        return super(SSLContext, self).wrap_bio(*args, **kwargs)
+
+
+# CR and LF are replaced by spaces in outbound lines
+CRLF_TABLE = bytes.maketrans(b'\r\n', b'  ')
+
+
+def build_line(head, text, tail=b'', encoding='utf8'):
+    """Build an outbound line from an encoded head and tail and a text.
+    CR and LF are replaced in a single pass:
+    .. code-block:: py
+        >>> build_line(b'PRIVMSG #chan :', 'a\\r\\nb')
+        b'PRIVMSG #chan :a  b'
+    """
+    return (head + text.encode(encoding) + tail).translate(CRLF_TABLE)
+
+
+class LineFramer:
+    """Split a byte stream in decoded lines. Only complete lines are
+    decoded and lines longer than max_length bytes are dropped:
+    .. code-block:: py
+        >>> framer = LineFramer('utf8', max_length=10)
+        >>> framer.feed(b'PING :a\\r\\nPI')
+        ['PING :a']
+        >>> framer.feed(b'NG :b\\r\\n' + b'x' * 20 + b'\\r\\nPONG\\n')
+        ['PING :b', 'PONG']
+        >>> framer.dropped
+        1
+        >>> framer.feed(b'0123456789\\r')
+        []
+        >>> framer.feed(b'\\nnext\\r\\n')
+        ['0123456789', 'next']
+    """
+
+    def __init__(self, encoding='utf8', max_length=0):
+        self.encoding = encoding
+        self.max_length = max_length
+        self.buffer = bytearray()
+        # True while the end of a too long line is skipped
+        self.discarding = False
+        self.dropped = 0
+
+    def feed(self, data):
+        """Add data. Return the lines completed by it"""
+        buf = self.buffer
+        start = len(buf)
+        buf += data
+        max_length = self.max_length
+        # data before start can't contain a line feed
+        end = buf.rfind(b'\n', start)
+        if end == -1:
+            if max_length and self.too_long(buf):
+                if not self.discarding:
+                    self.discarding = True
+                    self.dropped += 1
+                del buf[:]
+            return []
+        lines = bytes(buf[:end]).split(b'\n')
+        del buf[:end + 1]
+        if self.discarding:
+            self.discarding = False
+            lines.pop(0)
+        encoding = self.encoding
+        decoded = []
+        for line in lines:
+            if line[-1:] == b'\r':
+                line = line[:-1]
+            if max_length and len(line) > max_length:
+                self.dropped += 1
+                continue
+            decoded.append(line.decode(encoding, 'ignore'))
+        if max_length and self.too_long(buf):
+            self.discarding = True
+            self.dropped += 1
+            del buf[:]
+        return decoded
+
+    def too_long(self, buf):
+        """return True if the partial line in buf is already too long. A
+        trailing carriage return does not count"""
+        return len(buf) - (buf[-1:] == b'\r') > self.max_length
 
 
 class Config(dict):
@@ -272,6 +617,29 @@ def maybedotted(name):
     return name
 
 
+def dotted_name(ob):
+    """Return the dotted name resolved to ob by :func:`maybedotted`. Raise
+    ValueError when ob can't be found by name (lambdas, closures...):
+    .. code-block:: python
+        >>> dotted_name(IrcString)
+        'ene.interfaces.protocols.irc.utils.IrcString'
+        >>> dotted_name(lambda: None)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        ValueError: <function <lambda> at ...> can not be found by name
+    """
+    module = getattr(ob, '__module__', None)
+    qualname = getattr(ob, '__qualname__', None)
+    if module and qualname and '<' not in qualname:
+        name = module + '.' + qualname
+        try:
+            if maybedotted(name) is ob:
+                return name
+        except LookupError:
+            pass
+    raise ValueError('%r can not be found by name' % ob)
+
+
 class Handler(logging.Handler):
 
     def __init__(self, bot, *targets):
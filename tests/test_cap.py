@@ -0,0 +1,164 @@
+"""Capability negotiation and SASL against a scripted server on 127.0.0.1
+
+Usage::
+
+    $ python -m unittest tests.test_cap
+"""
+import base64
+import asyncio
+import unittest
+from ene.interfaces.protocols.irc.connection import Irc
+
+
+class StandInServer:
+    """Accept one connection and record the lines sent by the bot"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.lines = []
+        self.reader = self.writer = None
+        self.server = None
+        self.accepted = asyncio.Future(loop=loop)
+
+    @asyncio.coroutine
+    def start(self):
+        self.server = yield from asyncio.start_server(
+            self.accept, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    def accept(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.accepted.set_result(None)
+
+    @asyncio.coroutine
+    def readline(self, timeout=2):
+        line = yield from asyncio.wait_for(self.reader.readline(), timeout)
+        line = line.decode('utf8').rstrip('\r\n')
+        self.lines.append(line)
+        return line
+
+    @asyncio.coroutine
+    def expect(self, expected):
+        line = yield from self.readline()
+        assert line == expected, (expected, line)
+        return line
+
+    @asyncio.coroutine
+    def nothing(self, timeout=.2):
+        """assert the bot does not send anything for timeout seconds"""
+        try:
+            line = yield from self.readline(timeout)
+        except asyncio.TimeoutError:
+            return
+        raise AssertionError('Unexpected line %r' % line)
+
+    def send(self, *lines):
+        for line in lines:
+            self.writer.write(line.encode('utf8') + b'\r\n')
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.server.close()
+
+
+class TestSasl(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = StandInServer(self.loop)
+        self.bot = None
+
+    def tearDown(self):
+        if self.bot is not None:
+            self.bot.closing = True
+            if self.bot.protocol is not None:
+                self.bot.protocol.close()
+        self.server.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def connect(self, **config):
+        port = self.loop.run_until_complete(self.server.start())
+        config = dict(dict(sasl_mechanism='PLAIN', sasl_username='account',
+                           sasl_password='secret'), **config)
+        self.bot = Irc(nick='bot', host='127.0.0.1', port=port,
+                       loop=self.loop, flood_rate=0, **config)
+        self.bot.create_connection()
+        self.loop.run_until_complete(
+            asyncio.wait_for(self.server.accepted, 2))
+
+    @asyncio.coroutine
+    def authenticate(self):
+        server = self.server
+        yield from server.expect('CAP LS 302')
+        yield from server.expect('NICK bot')
+        line = yield from server.readline()
+        self.assertTrue(line.startswith('USER '), line)
+        server.send(':srv CAP * LS * :multi-prefix',
+                    ':srv CAP * LS :sasl=PLAIN,EXTERNAL')
+        yield from server.expect('CAP REQ :multi-prefix sasl')
+        server.send(':srv CAP bot ACK :multi-prefix sasl')
+        yield from server.expect('AUTHENTICATE PLAIN')
+        server.send('AUTHENTICATE +')
+        line = yield from server.readline()
+        payload = base64.b64decode(line.split(' ', 1)[1])
+        self.assertEqual(payload, b'account\0account\0secret')
+        # registration is held until the SASL result
+        yield from server.nothing()
+
+    @asyncio.coroutine
+    def register(self):
+        server = self.server
+        yield from server.expect('CAP END')
+        server.send(':srv 001 bot :Welcome')
+        # let the bot handle RPL_WELCOME
+        yield from server.nothing()
+        lines = server.lines
+        self.assertLess(lines.index('NICK bot'), lines.index('CAP END'))
+        self.assertIsNotNone(self.bot.time_to_ready)
+
+    def test_sasl_success(self):
+        self.connect()
+
+        @asyncio.coroutine
+        def script():
+            yield from self.authenticate()
+            self.server.send(':srv 903 bot :SASL authentication successful')
+            yield from self.register()
+
+        self.loop.run_until_complete(script())
+        self.assertTrue(self.bot.capabilities.authenticated)
+        self.assertEqual(self.bot.capabilities.enabled,
+                         {'multi-prefix', 'sasl'})
+
+    def test_sasl_failure(self):
+        self.connect()
+
+        @asyncio.coroutine
+        def script():
+            yield from self.authenticate()
+            self.server.send(':srv 904 bot :SASL authentication failed')
+            yield from self.register()
+
+        self.loop.run_until_complete(script())
+        self.assertFalse(self.bot.capabilities.authenticated)
+
+    def test_no_cap(self):
+        self.connect(caps=[], sasl_mechanism=None)
+
+        @asyncio.coroutine
+        def script():
+            yield from self.server.expect('NICK bot')
+            yield from self.server.readline()
+            self.server.send(':srv 001 bot :Welcome')
+            yield from self.server.nothing()
+            self.assertNotIn('CAP END', self.server.lines)
+
+        self.loop.run_until_complete(script())
+
+
+if __name__ == '__main__':
+    unittest.main()
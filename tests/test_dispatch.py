@@ -0,0 +1,123 @@
+"""Callbacks order with and without batch dispatch
+
+Usage::
+
+    $ python -m unittest tests.test_dispatch
+"""
+import re
+import asyncio
+import unittest
+from ene.interfaces.protocols.irc.connection import Irc
+
+
+class Event:
+    """Minimal event. Same api as the one used by IrcObject.attach_events"""
+
+    iotype = 'in'
+
+    def __init__(self, regexp, callback, iscoroutine=False):
+        self.regexp = regexp
+        self.callback = callback
+        self.iscoroutine = iscoroutine
+
+    def compile(self, config):
+        return re.compile(self.regexp.format(**config)).match
+
+    def async_callback(self, kwargs):
+        return self.callback(**kwargs)
+
+
+LINES = [
+    ':a!b@c PRIVMSG #chan :one',
+    ':a!b@c PRIVMSG #chan :two',
+    ':a!b@c NOTICE #chan :three',
+]
+
+
+class TestOrder(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def get_calls(self, dispatch):
+        calls = []
+        bot = Irc(loop=self.loop, nick='bot')
+
+        def sync(name):
+            return lambda mask, data: calls.append((name, data))
+
+        @asyncio.coroutine
+        def coroutine(mask, data):
+            calls.append(('coroutine', data))
+            yield from asyncio.sleep(0)
+
+        bot.attach_events(
+            Event(r'^:(?P<mask>\S+) PRIVMSG \S+ :(?P<data>.*)', coroutine,
+                  iscoroutine=True),
+            Event(r'^:(?P<mask>\S+) PRIVMSG \S+ :(?P<data>.*)', sync('msg')),
+            Event(r'^:(?P<mask>\S+) \S+ \S+ :(?P<data>.*)', sync('any')))
+        dispatch(bot)
+        self.loop.run_until_complete(asyncio.sleep(.01))
+        return calls
+
+    def test_batch_order(self):
+        def dispatch(bot):
+            for line in LINES:
+                bot.dispatch(line)
+
+        def dispatch_many(bot):
+            bot.dispatch_many(LINES)
+
+        expected = self.get_calls(dispatch)
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(expected[0], ('coroutine', 'one'))
+        self.assertEqual(self.get_calls(dispatch_many), expected)
+
+    def test_netsplit_order(self):
+        lines = [
+            'BATCH +x netsplit irc.a irc.b',
+            '@batch=x :a!b@c QUIT :irc.a irc.b',
+            '@batch=x :d!e@f QUIT :irc.a irc.b',
+            'BATCH -x',
+            ':a!b@c JOIN #chan',
+        ]
+        expected = [('QUIT', 'a!b@c'), ('QUIT', 'd!e@f'), ('JOIN', 'a!b@c')]
+
+        for dispatch in (lambda bot: [bot.dispatch(line) for line in lines],
+                         lambda bot: bot.dispatch_many(lines)):
+            calls = []
+            bot = Irc(loop=self.loop, nick='bot')
+            bot.attach_events(Event(
+                r'^:(?P<mask>\S+) (?P<command>QUIT|JOIN) ',
+                lambda mask, command: calls.append((command, mask))))
+            dispatch(bot)
+            self.loop.run_until_complete(asyncio.sleep(.01))
+            self.assertEqual(calls, expected)
+
+    def test_nick_changed(self):
+        lines = [
+            ':bot!u@h NICK :Other',
+            ':a!b@c INVITE Other :#c',
+            ':a!b@c INVITE bot :#d',
+        ]
+
+        for dispatch in (lambda bot: [bot.dispatch(line) for line in lines],
+                         lambda bot: bot.dispatch_many(lines)):
+            calls = []
+            bot = Irc(loop=self.loop, nick='bot')
+            bot.attach_events(Event(
+                r'^:(?P<mask>\S+) INVITE {nick} :?(?P<channel>\S+)',
+                lambda mask, channel: calls.append(channel)))
+            dispatch(bot)
+            self.loop.run_until_complete(asyncio.sleep(.01))
+            self.assertEqual(bot.config.nick, 'Other')
+            self.assertEqual(calls, ['#c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Scans kept in the scan_cache file
+
+Usage::
+
+    $ python -m unittest tests.test_scan
+"""
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import unittest
+import importlib
+from ene.interfaces.protocols.irc.connection import Irc
+
+PLUGIN = '''
+import re
+import venusian
+from ene.interfaces.protocols.irc import rfc
+
+# names of the callbacks found by venusian
+SCANS = []
+CALLS = []
+
+
+class Event:
+
+    iotype = 'in'
+    iscoroutine = False
+
+    def __init__(self, regexp, callback):
+        self.regexp = regexp
+        self.callback = callback
+
+    def compile(self, config):
+        return re.compile(getattr(self.regexp, 're', self.regexp)).match
+
+    def async_callback(self, kwargs):
+        return self.callback(**kwargs)
+
+
+def event(regexp):
+    def wrapper(func):
+        def callback(context, name, ob):
+            SCANS.append(func.__name__)
+            bot = context.context
+            if info.scope == 'class':
+                callback = getattr(bot.get_plugin(ob), func.__name__)
+            else:
+                callback = func
+            bot.attach_events(Event(regexp, callback))
+        info = venusian.attach(func, callback,
+                               category='ene.interfaces.protocols.irc')
+        return func
+    return wrapper
+
+
+class Plugin:
+
+    __irc3_plugin__ = True
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @event(rfc.JOIN)
+    def joined(self, mask, channel):
+        CALLS.append((self.bot, channel))
+
+
+@event(r'^:(?P<mask>\\S+) PART (?P<channel>\\S+)')
+def parted(mask, channel):
+    CALLS.append((None, channel))
+'''
+
+
+class TestScanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, 'scans.json')
+        with open(os.path.join(self.tmp.name, 'scanplugin.py'), 'w') as fd:
+            fd.write(PLUGIN)
+        sys.path.insert(0, self.tmp.name)
+        importlib.invalidate_caches()
+        self.module = importlib.import_module('scanplugin')
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        sys.modules.pop('scanplugin', None)
+        self.tmp.cleanup()
+        self.loop.close()
+
+    def get_bot(self):
+        return Irc(nick='bot', loop=self.loop, scan_cache=self.filename,
+                   includes=['scanplugin'])
+
+    def dispatch(self, bot):
+        del self.module.CALLS[:]
+        bot.dispatch(':a!b@c JOIN #join')
+        bot.dispatch(':a!b@c PART #part')
+        self.loop.run_until_complete(asyncio.sleep(0))
+        return self.module.CALLS
+
+    def test_scan_cache(self):
+        bot = self.get_bot()
+        self.assertEqual(sorted(self.module.SCANS), ['joined', 'parted'])
+        with open(self.filename) as fd:
+            scans = json.load(fd)['scans']
+        self.assertEqual([scan['module'] for scan in scans], ['scanplugin'])
+        self.assertEqual(self.dispatch(bot), [(bot, '#join'), (None, '#part')])
+
+        # a new bot rebinds the saved events to its own plugin
+        del self.module.SCANS[:]
+        bot = self.get_bot()
+        self.assertEqual(self.module.SCANS, [])
+        self.assertEqual(self.dispatch(bot), [(bot, '#join'), (None, '#part')])
+
+        # a changed module is scanned again
+        with open(self.module.__file__, 'a') as fd:
+            fd.write('\n')
+        self.get_bot()
+        self.assertEqual(sorted(self.module.SCANS), ['joined', 'parted'])
+
+    def test_reload(self):
+        bot = self.get_bot()
+        del self.module.SCANS[:]
+        bot.reload()
+        self.assertEqual(self.module.SCANS, [])
+        # named modules are always reimported
+        bot.reload('scanplugin')
+        module = sys.modules['scanplugin']
+        self.assertEqual(sorted(module.SCANS), ['joined', 'parted'])
+        self.module = module
+        self.assertEqual(self.dispatch(bot), [(bot, '#join'), (None, '#part')])
+
+
+if __name__ == '__main__':
+    unittest.main()
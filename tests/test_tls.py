@@ -0,0 +1,100 @@
+"""TLS connections and session resumption against a server on 127.0.0.1
+
+Usage::
+
+    $ python -m unittest tests.test_tls
+"""
+import os
+import ssl
+import asyncio
+import unittest
+from ene.interfaces.protocols.irc.connection import Irc
+
+CERTFILE = os.path.join(os.path.dirname(__file__), 'keycert.pem')
+
+
+class TLSServer:
+    """Accept TLS connections and greet each client with RPL_WELCOME"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.server = None
+        self.writers = []
+        self.accepted = asyncio.Queue(loop=loop)
+
+    @asyncio.coroutine
+    def start(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS)
+        context.load_cert_chain(CERTFILE)
+        self.server = yield from asyncio.start_server(
+            self.accept, '127.0.0.1', 0, ssl=context)
+        return self.server.sockets[0].getsockname()[1]
+
+    @asyncio.coroutine
+    def accept(self, reader, writer):
+        self.writers.append(writer)
+        # wait for the registration so the client reads our reply
+        yield from reader.readline()
+        writer.write(b':srv 001 bot :Welcome\r\n')
+        self.accepted.put_nowait(writer)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+
+
+class TestTLS(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = TLSServer(self.loop)
+        self.bot = None
+
+    def tearDown(self):
+        if self.bot is not None:
+            self.bot.closing = True
+            if self.bot.protocol is not None:
+                self.bot.protocol.close()
+        self.server.close()
+        self.loop.run_until_complete(asyncio.sleep(.1))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    @asyncio.coroutine
+    def accepted(self):
+        yield from asyncio.wait_for(self.server.accepted.get(), 2)
+        # let the bot read the welcome line and the session tickets
+        yield from asyncio.sleep(.1)
+
+    def test_create_ssl_context(self):
+        bot = Irc(nick='bot', loop=self.loop, ssl=True,
+                  ssl_verify='CERT_REQUIRED')
+        context = bot.get_ssl_context(('irc.example.com', 6697))
+        self.assertIsInstance(context, ssl.SSLContext)
+        self.assertEqual(context.verify_mode, ssl.CERT_REQUIRED)
+        self.assertTrue(context.check_hostname)
+        self.assertIs(bot.get_ssl_context(('irc.example.com', 6697)),
+                      context)
+
+    def test_session_reused(self):
+        port = self.loop.run_until_complete(self.server.start())
+        self.bot = Irc(nick='bot', host='127.0.0.1', port=port,
+                       loop=self.loop, ssl=True, flood_rate=0,
+                       caps=[], reconnect_cap=0)
+        self.bot.create_connection()
+        for i in range(3):
+            if i:
+                self.bot.reconnect()
+            self.loop.run_until_complete(self.accepted())
+        handshakes = list(self.bot.handshakes)
+        self.assertEqual(len(handshakes), 3)
+        self.assertTrue(all(h['tls'] for h in handshakes))
+        self.assertFalse(handshakes[0]['reused'])
+        self.assertTrue(handshakes[-1]['reused'])
+
+
+if __name__ == '__main__':
+    unittest.main()